@@ -1,8 +1,10 @@
 import time
+import logging
 from utils import UIUtils
 from pdf_processor import PDFProcessor
 from data_processor import DataProcessor
 from csv_exporter import CSVExporter
+from config import LOG_LEVEL
 
 def print_robot():
     robot = """
@@ -62,4 +64,5 @@ def main():
     print_robot()
 
 if __name__ == "__main__":
+    logging.basicConfig(level=LOG_LEVEL, format="%(message)s")
     main() 
\ No newline at end of file
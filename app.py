@@ -1,22 +1,53 @@
 import os
+import re
 import csv
-import math
+import json
+import logging
+import logging.handlers
+import queue
+import atexit
 import shutil
 import time
+import uuid
+import threading
+import hashlib
 from pathlib import Path
+from collections import OrderedDict
 import platform
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
-from io import StringIO
-from flask import Flask, render_template, request, send_file, jsonify, session, make_response
+from io import StringIO, BytesIO
+from flask import Flask, render_template, request, send_from_directory, jsonify, session, make_response, g
 from werkzeug.utils import secure_filename
-from pdf_processor import PDFProcessor
+from werkzeug.exceptions import BadRequest, HTTPException, NotFound
+from config import OUTPUT_CSV_NAME, PDF_THREAD_COUNT, LOG_LEVEL, PIPELINE_WORKERS, USE_X_SENDFILE, MAX_PDF_BYTES, DEBUG_SESSIONS_ENDPOINT, CSV_NA_VALUES  # e.g. "combined_data.csv"
+
+# Request threads only enqueue log records; a listener thread does the writes
+_log_queue = queue.SimpleQueue()
+_log_stream = logging.StreamHandler()
+_log_stream.setFormatter(logging.Formatter("%(message)s"))
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_stream)
+_log_listener.start()
+atexit.register(_log_listener.stop)  # Flush queued records on shutdown
+
+_log_queue_handler = logging.handlers.QueueHandler(_log_queue)
+# The processing modules log under their own names through the same queue
+for _logger_name in (__name__, 'data_processor', 'pdf_processor', 'csv_exporter', 'utils'):
+    _module_logger = logging.getLogger(_logger_name)
+    _module_logger.setLevel(LOG_LEVEL)
+    _module_logger.addHandler(_log_queue_handler)
+    _module_logger.propagate = False
+logger = logging.getLogger(__name__)
+
+# Imported once logging is set up, so their import-time messages are queued too
 from data_processor import DataProcessor
 from csv_exporter import CSVExporter
-from config import OUTPUT_CSV_NAME  # e.g. "combined_data.csv"
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = os.path.dirname(os.path.abspath(__file__))
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['USE_X_SENDFILE'] = USE_X_SENDFILE  # Hand downloads to the front proxy
 # Cookie configuration for cross-origin support
 app.config['SESSION_COOKIE_SAMESITE'] = 'None'  # Allow cookie in iframe
 # Auto-detect HTTPS environment for secure cookies
@@ -28,15 +59,103 @@ app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-here')  # Use env
 
 # Log cookie configuration for debugging
 cookie_config = f"SameSite=None, Secure={app.config['SESSION_COOKIE_SECURE']}, HttpOnly={app.config['SESSION_COOKIE_HTTPONLY']}"
-print(f"🍪 Cookie Configuration: {cookie_config} (Production: {bool(is_production)})")
+logger.info("🍪 Cookie Configuration: %s (Production: %s)", cookie_config, bool(is_production))
+
+# Use the multi-threaded PyArrow CSV parser when pyarrow is installed
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.compute as pc
+except ImportError:
+    pa = pa_csv = pc = None
+logger.info("📊 CSV parser: %s", 'pyarrow' if pa_csv else 'pandas')
+
+# Keep a Parquet copy of merged session data when pyarrow has Parquet support
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+# JIT-compile the Cancel Date parser when numba is installed
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Use the SIMD pybase64 decoder for base64 uploads when it is installed
+# (same signature as base64.b64decode)
+try:
+    from pybase64 import b64decode
+except ImportError:
+    from base64 import b64decode
+
+# Serialize JSON responses with orjson when it is installed
+try:
+    import orjson
+    from flask.json.provider import DefaultJSONProvider
+except ImportError:
+    orjson = None
+else:
+    class OrJSONProvider(DefaultJSONProvider):
+        """Flask JSON provider backed by orjson.
+
+        Dates and anything else orjson can't encode natively go through
+        Flask's default(), so responses keep their existing formats.
+        """
+        option = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY |
+                  orjson.OPT_PASSTHROUGH_DATETIME)
+
+        def dumps(self, obj, **kwargs):
+            option = self.option | orjson.OPT_SORT_KEYS if self.sort_keys else self.option
+            return orjson.dumps(obj, default=self.default, option=option).decode()
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+    app.json = OrJSONProvider(app)
+# Compact, unsorted JSON bodies: no indent in debug mode and no key sort per response
+app.json.compact = True
+app.json.sort_keys = False
+logger.info("🧾 JSON encoder: %s", 'orjson' if orjson else 'json')
+
+# Parsed session CSVs, keyed by (path, mtime_ns, size) -> (cached_at, DataFrame),
+# least recently used first; shared by the request threads, so guarded by a lock
+_csv_cache = OrderedDict()
+_csv_cache_lock = threading.Lock()
+CSV_CACHE_TTL = 600  # seconds
+CSV_CACHE_MAX_ENTRIES = 16
+
+# /debug-sessions directory walks, reused briefly between polls
+_sessions_cache = {}
+SESSIONS_CACHE_TTL = 2  # seconds
+# Rows per chunk when streaming uploaded CSVs
+CSV_CHUNK_ROWS = 50_000
+# Base64 characters decoded per write when saving uploads (3 MiB decoded)
+B64_CHUNK_CHARS = 4 * 1024 * 1024
+_B64_NON_ALPHABET = re.compile(r'[^A-Za-z0-9+/=]')
+# Longest data URL header ("data:<mime>;<params>;base64,") searched for its comma
+DATA_URL_HEADER_MAX = 1024
 
 # Allowed extensions for PDF upload
-ALLOWED_PDF_EXTENSIONS = {'pdf'}
+ALLOWED_PDF_EXTENSIONS = frozenset({'pdf'})
 # Allowed extensions for CSV/XLSX upload
-ALLOWED_CSV_EXTENSIONS = {'csv', 'xlsx', 'xls'}
+ALLOWED_CSV_EXTENSIONS = frozenset({'csv', 'xlsx', 'xls'})
+
+def poppler_check_cached(sentinel):
+    """True if an earlier worker already verified poppler and pdftoppm hasn't changed since."""
+    pdftoppm = shutil.which('pdftoppm')
+    try:
+        return pdftoppm is not None and sentinel.stat().st_mtime > os.path.getmtime(pdftoppm)
+    except OSError:
+        return False
 
-# Check if poppler is installed or install it if on Render
-if os.environ.get('RENDER') and platform.system() != 'Windows':
+# Check if poppler is installed or install it if on Render. The result is
+# recorded in a sentinel file so restarted/forked workers skip the render test.
+POPPLER_SENTINEL = Path(app.config['UPLOAD_FOLDER']) / ".poppler_ok"
+if os.environ.get('RENDER') and platform.system() != 'Windows' and poppler_check_cached(POPPLER_SENTINEL):
+    os.environ['POPPLER_WORKING'] = '1'
+    logger.info("Poppler verified earlier; skipping the startup test.")
+elif os.environ.get('RENDER') and platform.system() != 'Windows':
     try:
         # Try to use poppler
         from pdf2image import convert_from_path
@@ -48,20 +167,456 @@ if os.environ.get('RENDER') and platform.system() != 'Windows':
                 f.write(b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj 2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj 3 0 obj<</Type/Page/MediaBox[0 0 3 3]/Parent 2 0 R/Resources<<>>>>endobj\nxref\n0 4\n0000000000 65535 f\n0000000010 00000 n\n0000000053 00000 n\n0000000102 00000 n\ntrailer<</Size 4/Root 1 0 R>>\nstartxref\n180\n%%EOF\n")
         
         # Test if poppler works
-        pages = convert_from_path(str(test_pdf), dpi=72)
-        print(f"Poppler working correctly. Detected {len(pages)} pages.")
+        pages = convert_from_path(str(test_pdf), dpi=72, thread_count=PDF_THREAD_COUNT)
+        logger.info("Poppler working correctly. Detected %s pages.", len(pages))
+        os.environ['POPPLER_WORKING'] = '1'
+        POPPLER_SENTINEL.touch()
     except Exception as e:
-        print(f"Error with poppler: {e}")
-        print("Poppler not available, functionality will be limited")
+        logger.error("Error with poppler: %s", e)
+        logger.warning("Poppler not available, functionality will be limited")
+
+
+# Error responses for each PipelineRunner stage
+PIPELINE_ERRORS = {
+    'pdf': ('PDF processing failed', 'Could not extract text from PDF. Check server logs for more details.'),
+    'text': ('Text processing failed', 'Could not process extracted text files. Check server logs for more details.'),
+    'csv': ('CSV creation failed', 'Could not create final CSV file. Check server logs for more details.'),
+    'cancelled': ('Processing cancelled', 'The session was cleared before processing finished.'),
+}
 
+# Background pipeline runs for ?_async=1 uploads: session_id -> (runner, future),
+# only while the job runs. The outcome lives in a job file in the session directory
+# so every gunicorn worker sees it, not just the one that started the job.
+pipeline_executor = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS)
+PIPELINE_JOBS = {}
+PIPELINE_JOB_FILE = '.pipeline_job.json'
+# A 'processing' job file older than this is from a worker that died mid-job
+PIPELINE_JOB_STALE_AFTER = 3600  # seconds
+
+# Session directories are renamed aside and deleted off the request thread
+cleanup_executor = ThreadPoolExecutor(max_workers=2)
+
+def remove_session_dir(session_dir):
+    """Free session_dir immediately and delete its contents in the background.
+
+    The directory is renamed to a hidden staging name (the same filesystem, so
+    this is atomic) and rmtree runs on cleanup_executor. Falls back to an
+    inline rmtree if the rename fails.
+    """
+    evict_cached_csvs(session_dir)
+    parent, name = os.path.split(session_dir.rstrip(os.sep))
+    staging = os.path.join(parent, f".trash_{name}_{uuid.uuid4().hex[:8]}")
+    try:
+        os.rename(session_dir, staging)
+    except OSError:
+        shutil.rmtree(session_dir)
+        return
+    cleanup_executor.submit(shutil.rmtree, staging, ignore_errors=True)
+
+def purge_trash_dirs():
+    """Queue deletion of staging dirs left behind by a worker that exited mid-cleanup."""
+    sessions_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'processing_sessions')
+    try:
+        with os.scandir(sessions_dir) as entries:
+            leftovers = [e.path for e in entries if e.name.startswith('.trash_')]
+    except FileNotFoundError:
+        return
+    for path in leftovers:
+        cleanup_executor.submit(shutil.rmtree, path, ignore_errors=True)
+
+purge_trash_dirs()
+
+def make_pdf_processor(session_dir):
+    """PDFProcessor for session_dir; pdfplumber/pdf2image load on first use, not at worker boot."""
+    from pdf_processor import PDFProcessor
+    return PDFProcessor(session_dir=session_dir)
+
+def make_pipeline_runner(processor, all_pdfs=False, is_cancelled=None):
+    """PipelineRunner for a DataProcessor, importing the PDF stack lazily."""
+    from pdf_processor import PipelineRunner
+    return PipelineRunner(processor, all_pdfs=all_pdfs, is_cancelled=is_cancelled)
+
+def wants_async():
+    """True when the client asked for background processing with ?_async=1."""
+    return request.args.get('_async', '').lower() in ('1', 'true')
+
+def write_pipeline_job_state(session_dir, state):
+    """Record a job's state in session_dir, replacing the job file atomically."""
+    job_file = os.path.join(session_dir, PIPELINE_JOB_FILE)
+    staging = f"{job_file}.{uuid.uuid4().hex[:8]}"
+    try:
+        with open(staging, 'w') as f:
+            json.dump(state, f)
+        os.replace(staging, job_file)
+    except OSError as e:
+        # The session may have been cleared while the job ran
+        logger.warning("⚠️ Could not record pipeline job state in %s: %s", session_dir, e)
+
+def read_pipeline_job_state(session_dir):
+    """The job file's state plus its age in seconds, or (None, None) without one."""
+    job_file = os.path.join(session_dir, PIPELINE_JOB_FILE)
+    try:
+        with open(job_file) as f:
+            state = json.load(f)
+        return state, time.time() - os.stat(job_file).st_mtime
+    except (OSError, ValueError):
+        return None, None
+
+def run_pipeline_job(runner, session_dir):
+    """Background job body: run the pipeline and record how it ended."""
+    try:
+        succeeded = runner.run()
+        if succeeded:
+            outcome = {'state': 'done'}
+        else:
+            error, details = PIPELINE_ERRORS[runner.failed_stage]
+            outcome = {'state': 'failed', 'error': error, 'details': details}
+    except Exception as e:
+        logger.error("❌ Pipeline job failed in %s: %s", session_dir, e)
+        succeeded, outcome = False, {'state': 'failed', 'error': str(e)}
+    # A cancelled runner's session was cleared meanwhile; don't report into
+    # whatever session has taken its place
+    if not runner.cancelled:
+        write_pipeline_job_state(session_dir, outcome)
+    return succeeded
+
+def start_pipeline_job(processor, all_pdfs=False):
+    """Run the session's pipeline on the background executor; returns the 202 response."""
+    session_id = processor.session_id
+    session_dir = processor.session_dir
+    token = uuid.uuid4().hex
+
+    def session_replaced():
+        # Another worker clearing or recreating the session drops this job's token
+        state, _ = read_pipeline_job_state(session_dir)
+        return state is None or state.get('token') != token
+
+    runner = make_pipeline_runner(processor, all_pdfs=all_pdfs, is_cancelled=session_replaced)
+    write_pipeline_job_state(session_dir, {'state': 'processing', 'token': token})
+    future = pipeline_executor.submit(run_pipeline_job, runner, session_dir)
+    PIPELINE_JOBS[session_id] = (runner, future)
+
+    def forget_job(done):
+        # The outcome is in the job file by now; drop the runner and its parsed rows
+        job = PIPELINE_JOBS.get(session_id)
+        if job is not None and job[1] is done:
+            PIPELINE_JOBS.pop(session_id, None)
+
+    future.add_done_callback(forget_job)
+    logger.info("⏳ Pipeline job queued for session: %s", session_id)
+    return jsonify({
+        'message': 'Processing started',
+        'status': 'processing',
+        'session_id': session_id,
+        'status_url': f'/status?_sid={session_id}'
+    }), 202
+
+def pipeline_job_status(session_id):
+    """Describe the background job for a session, or None if it has none."""
+    if not session_id:
+        return None
+    state, age = read_pipeline_job_state(session_dir_for(session_id))
+    if state is None:
+        return None
+    if state['state'] == 'processing' and session_id not in PIPELINE_JOBS and age > PIPELINE_JOB_STALE_AFTER:
+        return {'state': 'failed', 'error': 'Processing stopped without a result'}
+    state.pop('token', None)
+    return state
+
+def cancel_pipeline_job(session_id):
+    """Stop this worker's background job for a session before it is cleared."""
+    job = PIPELINE_JOBS.pop(session_id, None)
+    if job is not None:
+        job[0].cancel()
+
+def pipeline_job_running(session_id):
+    """True while a background job (in any worker) is still processing the session."""
+    if session_id in PIPELINE_JOBS:
+        return True
+    state, age = read_pipeline_job_state(session_dir_for(session_id))
+    return state is not None and state['state'] == 'processing' and age <= PIPELINE_JOB_STALE_AFTER
+
+def pipeline_error_response(runner, processor):
+    """Build the 500 response for the stage a PipelineRunner failed at."""
+    error, details = PIPELINE_ERRORS[runner.failed_stage]
+    logger.error("❌ %s - check logs for details", error)
+    return jsonify({
+        'error': error,
+        'details': details,
+        'session_id': processor.session_id
+    }), 500
+
+def file_extension(filename):
+    """Lowercased extension of filename without the dot ('' if it has none)."""
+    return os.path.splitext(filename)[1][1:].lower()
 
 def allowed_file(filename, allowed_set):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_set
+    return file_extension(filename) in allowed_set
+
+def read_csv_as_str(file_path):
+    """Read a CSV with every column as a string, preferring the PyArrow parser.
+
+    Column types are pinned to string up front so PyArrow never infers
+    numbers (which would turn "80.00" into "80.0"). Anything PyArrow cannot
+    read the same way pandas would is handed to pd.read_csv instead.
+    """
+    if pa_csv is not None:
+        try:
+            with open(file_path, newline='', encoding='utf-8-sig') as f:
+                header = next(csv.reader(f))
+            if header and '' not in header and len(set(header)) == len(header):
+                table = pa_csv.read_csv(
+                    file_path,
+                    parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+                    convert_options=pa_csv.ConvertOptions(
+                        column_types={name: pa.string() for name in header},
+                        null_values=CSV_NA_VALUES,
+                        strings_can_be_null=True
+                    )
+                )
+                df = table.to_pandas()
+                return df.where(df.notna(), np.nan)
+        except (StopIteration, UnicodeDecodeError, ValueError):
+            # Empty or malformed input; let pandas report it the usual way.
+            pass
+    return pd.read_csv(file_path, dtype=str)
+
+def _needs_csv_quoting(table):
+    """True if any string value holds a comma, quote or line break (which pandas would quote)."""
+    for column in table.columns:
+        if pa.types.is_dictionary(column.type):  # Categorical columns
+            column = column.cast(column.type.value_type)
+        if pa.types.is_string(column.type) and pc.any(pc.match_substring_regex(column, r'[,"\r\n]')).as_py():
+            return True
+    return False
+
+def write_csv_file(df, file_path):
+    """Write df like df.to_csv(index=False), using PyArrow's CSV writer when possible.
+
+    PyArrow can't quote only the fields that need it the way pandas does,
+    so frames with such values (e.g. "1,000") go straight to pandas.
+    """
+    if pa_csv is not None:
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if _needs_csv_quoting(table):
+                df.to_csv(file_path, index=False)
+                return
+            # Header goes through the csv module so names are quoted exactly like pandas does
+            with open(file_path, 'w', newline='', encoding='utf-8') as f:
+                csv.writer(f, lineterminator='\n').writerow(df.columns)
+            # quoting_style='none' raises on values that would need quoting
+            with open(file_path, 'ab') as f:
+                pa_csv.write_csv(table, f, write_options=pa_csv.WriteOptions(
+                    include_header=False, quoting_style='none'))
+            return
+        except (pa.ArrowException, ValueError, TypeError) as e:
+            logger.warning("⚠️ PyArrow CSV write failed, falling back to pandas: %s", e)
+    df.to_csv(file_path, index=False)
+
+def count_csv_rows(file_path):
+    """Count data rows (excluding the header) by counting newlines in 1 MiB chunks.
+
+    Newlines inside quoted fields don't end a record, so once a quote has
+    been seen each chunk is scanned with NumPy: a running quote-count parity
+    marks which newlines are inside quotes (an escaped "" flips it twice).
+    """
+    newlines = 0
+    last = b''
+    in_quotes = 0
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            if in_quotes or b'"' in chunk:
+                data = np.frombuffer(chunk, dtype=np.uint8)
+                parity = (np.cumsum(data == 34) + in_quotes) & 1
+                newlines += int(np.count_nonzero((data == 10) & (parity == 0)))
+                in_quotes = int(parity[-1])
+            else:
+                newlines += chunk.count(b'\n')
+            last = chunk
+    if last and not last.endswith(b'\n'):
+        newlines += 1  # Final row without a trailing newline
+    return newlines - 1
+
+def _store_cached_csv(key, entry):
+    """Cache entry under key, replacing older versions of the file and enforcing the size cap."""
+    with _csv_cache_lock:
+        for old_key in [old_key for old_key in _csv_cache if old_key[0] == key[0]]:
+            del _csv_cache[old_key]
+        _csv_cache[key] = entry
+        while len(_csv_cache) > CSV_CACHE_MAX_ENTRIES:
+            _csv_cache.popitem(last=False)
+
+def read_cached_csv(file_path):
+    """Read a CSV via read_csv_as_str, reusing the parsed frame while the file is unchanged."""
+    stat = os.stat(file_path)
+    key = (file_path, stat.st_mtime_ns, stat.st_size)
+    now = time.time()
+    
+    with _csv_cache_lock:
+        # Drop expired entries and older versions of this file
+        for old_key, (cached_at, _) in list(_csv_cache.items()):
+            if now - cached_at > CSV_CACHE_TTL or (old_key[0] == file_path and old_key != key):
+                del _csv_cache[old_key]
+        entry = _csv_cache.get(key)
+        if entry is not None:
+            _csv_cache.move_to_end(key)
+    
+    if entry is None:
+        # Parse outside the lock so other sessions' reads aren't held up
+        df = read_parquet_sidecar(file_path, stat)
+        entry = (now, read_csv_as_str(file_path) if df is None else df)
+        _store_cached_csv(key, entry)
+    return entry[1].copy()
+
+def cache_csv_frame(file_path, df):
+    """Seed the cache with df, just written to file_path, so the next read skips parsing.
+
+    The frame is stored the way reading the CSV back would see it: object
+    values, a fresh index, and CSV_NA_VALUES as missing.
+    """
+    stat = os.stat(file_path)
+    df = df.astype(object).reset_index(drop=True)
+    df = df.where(df.notna() & ~df.isin(CSV_NA_VALUES), np.nan)
+    _store_cached_csv((file_path, stat.st_mtime_ns, stat.st_size), (time.time(), df))
+
+def evict_cached_csvs(directory):
+    """Forget cached frames for files under directory (e.g. a session being removed)."""
+    prefix = os.path.join(directory, '')
+    with _csv_cache_lock:
+        for key in [key for key in _csv_cache if key[0].startswith(prefix)]:
+            del _csv_cache[key]
+
+def parquet_sidecar_path(csv_path):
+    """Hidden Parquet copy next to a CSV: combined_data.csv -> .combined_data.parquet."""
+    directory, name = os.path.split(csv_path)
+    return os.path.join(directory, '.' + os.path.splitext(name)[0] + '.parquet')
+
+# Hidden per-session files the contamination cleanup removes along with the
+# visible ones: a finished job's record and the combined CSV's Parquet copy
+SESSION_STATE_FILES = frozenset({PIPELINE_JOB_FILE, os.path.basename(parquet_sidecar_path(OUTPUT_CSV_NAME))})
+
+def _csv_signature(stat):
+    return f"{stat.st_mtime_ns}:{stat.st_size}".encode()
+
+def write_parquet_sidecar(df, csv_path):
+    """Save df as the Parquet copy of the CSV just written to csv_path.
+
+    Values are stored the way reading the CSV back would see them (strings,
+    with CSV_NA_VALUES as missing), and the file is tagged with the CSV's
+    mtime and size so a CSV rewritten by anything else is never shadowed.
+    """
+    if pq is None:
+        return
+    sidecar = parquet_sidecar_path(csv_path)
+    try:
+        df = df.astype(object)
+        df = df.where(df.notna() & ~df.isin(CSV_NA_VALUES), None)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[b'source_csv'] = _csv_signature(os.stat(csv_path))
+        pq.write_table(table.replace_schema_metadata(metadata), sidecar)
+    except (pa.ArrowException, ValueError, TypeError, OSError) as e:
+        logger.warning("⚠️ Could not write Parquet copy of %s: %s", os.path.basename(csv_path), e)
+        try:
+            os.remove(sidecar)
+        except OSError:
+            pass
+
+def read_parquet_sidecar(csv_path, stat):
+    """The CSV's Parquet copy as read_csv_as_str would return it, or None if absent or stale."""
+    if pq is None:
+        return None
+    sidecar = parquet_sidecar_path(csv_path)
+    try:
+        if (pq.read_schema(sidecar).metadata or {}).get(b'source_csv') != _csv_signature(stat):
+            return None
+        df = pq.read_table(sidecar).to_pandas()
+    except (FileNotFoundError, pa.ArrowException):
+        return None
+    return df.astype(object).where(df.notna(), np.nan)
+
+def strip_data_url_prefix(data):
+    """Return the base64 payload of a data URL (everything after the first comma).
+
+    Slices once instead of split(','), which scans the whole payload and
+    builds a list of every comma-separated piece. The comma is only looked
+    for in the first DATA_URL_HEADER_MAX characters, so a bare base64 string
+    (which has no comma) isn't scanned end to end.
+    """
+    comma = data.find(',', 0, DATA_URL_HEADER_MAX)
+    return data if comma == -1 else data[comma + 1:]
+
+def base64_decoded_size(payload):
+    """Decoded byte length of a base64 payload, computed without decoding it.
+
+    Line breaks and other characters outside the alphabet are skipped by the
+    decoder, so they don't count towards the size.
+    """
+    ignored = sum(1 for _ in _B64_NON_ALPHABET.finditer(payload))
+    padding = min(payload.count('=', max(0, len(payload) - 8)), 2)
+    return (len(payload) - ignored) * 3 // 4 - padding
+
+def pdf_too_large_response(size):
+    """413 response for a PDF larger than MAX_PDF_BYTES."""
+    return jsonify({
+        'error': 'PDF too large',
+        'details': f'PDF is {size} bytes; the limit is {MAX_PDF_BYTES} bytes'
+    }), 413
+
+def write_file_bytes(file_path, data):
+    """Write a decoded upload to disk with unbuffered writes (no extra copy through a Python buffer)."""
+    with open(file_path, 'wb', buffering=0) as f:
+        _write_all(f, data)
+
+def write_base64_file(file_path, payload):
+    """Decode base64 text to file_path chunk by chunk; returns the decoded size.
+
+    Only one chunk of decoded bytes is held at a time instead of the whole
+    file. Characters outside the base64 alphabet (e.g. MIME line breaks) are
+    dropped first, as b64decode would, so chunks stay aligned to 4-char
+    groups. A partial file is removed if decoding fails.
+    """
+    total = 0
+    carry = ''
+    try:
+        with open(file_path, 'wb', buffering=0) as f:
+            for start in range(0, len(payload), B64_CHUNK_CHARS):
+                chunk = carry + _B64_NON_ALPHABET.sub('', payload[start:start + B64_CHUNK_CHARS])
+                usable = len(chunk) - len(chunk) % 4
+                carry = chunk[usable:]
+                if usable:
+                    total += _write_all(f, b64decode(chunk[:usable]))
+            if carry:
+                total += _write_all(f, b64decode(carry))  # Raises on bad padding
+    except Exception:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    return total
+
+def write_temp_upload(session_dir, name, base64_data):
+    """Decode a base64 CSV upload to temp_<name> in session_dir and return its path.
+
+    Decoding goes chunk by chunk (write_base64_file), so the decoded CSV is
+    never held in memory in full; other uploads are parsed in place.
+    """
+    file_path = os.path.join(session_dir, secure_filename(f"temp_{name}"))
+    write_base64_file(file_path, base64_data)
+    return file_path
+
+def _write_all(f, data):
+    """Write all of data to an unbuffered file; returns the number of bytes."""
+    view = memoryview(data)
+    while view:
+        view = view[f.write(view):]
+    return len(data)
 
 def process_pdf():
     """Process the PDF file through our pipeline."""
     try:
         # Initialize processors
+        from pdf_processor import PDFProcessor
         pdf_processor = PDFProcessor()
         data_processor = DataProcessor()
         csv_exporter = CSVExporter()
@@ -81,7 +636,7 @@ def process_pdf():
     except Exception as e:
         return False, str(e)
 
-def process_csv_file(file_path, session_dir):
+def process_csv_file(file_path, session_dir, filename=None):
     """Process and merge incoming CSV/Excel data with the PDF CSV by matching on:
        - Invoice No.
        - Style
@@ -94,19 +649,12 @@ def process_csv_file(file_path, session_dir):
        - "Order No." -> "Purchase Order No."
        - "Delivery Date" -> "Start Date"
        - "Cancel Date" -> "Cancel Date"
+       
+       file_path may also be an open file-like object (text or binary, e.g. an
+       upload stream); filename then supplies the extension.
     """
     try:
-        # Read input file as DataFrame with all columns as strings
-        ext = os.path.splitext(file_path)[1].lower()
-        if ext == ".csv":
-            incoming_df = pd.read_csv(file_path, dtype=str)
-        elif ext in [".xlsx", ".xls"]:
-            incoming_df = pd.read_excel(file_path, dtype=str)
-        else:
-            return False, "Unsupported file extension"
-        
-        # Rename incoming columns used for matching.
-        incoming_df.rename(columns={"Cartons*": "Cartons", "Pieces*": "Individual Pieces"}, inplace=True)
+        matching_columns = ["Invoice No.", "Style", "Cartons", "Individual Pieces"]
         
         # Define mapping for additional fields using header names:
         additional_mapping = {
@@ -117,249 +665,423 @@ def process_csv_file(file_path, session_dir):
             "Cancel Date": "Cancel Date"
         }
         
+        # Create a composite match key in both DataFrames, one column at a time
+        # with vectorized string ops (no per-row Python function calls).
+        def create_match_key(df, cols):
+            parts = [normalize_match_column(df[col]) for col in cols]
+            return parts[0].str.cat(parts[1:], sep="_")
+        
+        def prepare_incoming(df):
+            """Rename match columns, add match_key and keep one row per key with only the columns the merge reads."""
+            # Rename incoming columns used for matching.
+            df = df.rename(columns={"Cartons*": "Cartons", "Pieces*": "Individual Pieces"})
+            if not all(col in df.columns for col in matching_columns):
+                return df  # Reported by the column check below
+            df["match_key"] = hash_match_keys(create_match_key(df, matching_columns))
+            mapped_cols = [col for col in additional_mapping if col in df.columns]
+            # The last row for a key is the one the merge applies
+            return df[matching_columns + ["match_key"] + mapped_cols].drop_duplicates("match_key", keep="last")
+        
+        # Only the match and mapped columns are ever read from the incoming file
+        incoming_columns = set(matching_columns) | {"Cartons*", "Pieces*"} | set(additional_mapping)
+        
+        # Read input file as DataFrame with all columns as strings. CSVs are
+        # streamed in chunks so large exports never sit in memory in full, and
+        # columns the merge doesn't use are skipped by the parser.
+        ext = os.path.splitext(filename or file_path)[1].lower()
+        if ext == ".csv":
+            incoming_rows = 0
+            parts = []
+            for chunk in pd.read_csv(file_path, dtype=str, chunksize=CSV_CHUNK_ROWS,
+                                     usecols=lambda col: col in incoming_columns):
+                incoming_rows += len(chunk)
+                parts.append(prepare_incoming(chunk))
+            incoming_df = pd.concat(parts, ignore_index=True)
+            if "match_key" in incoming_df.columns and len(parts) > 1:
+                incoming_df = incoming_df.drop_duplicates("match_key", keep="last")
+        elif ext in [".xlsx", ".xls"]:
+            # pandas already opens .xlsx with openpyxl in read-only, values-only
+            # mode; usecols keeps the unused columns out of the frame
+            raw_df = pd.read_excel(file_path, dtype=str, usecols=lambda col: col in incoming_columns)
+            incoming_rows = len(raw_df)
+            incoming_df = prepare_incoming(raw_df)
+            del raw_df
+        else:
+            return False, "Unsupported file extension"
+        
         # Read existing combined CSV (from PDF processing) from session directory
         combined_csv_path = os.path.join(session_dir, OUTPUT_CSV_NAME)
         
         # **DEBUG INFO**: Log session directory contents
-        print(f"🔍 DEBUG: Session directory: {session_dir}")
-        print(f"🔍 DEBUG: Looking for combined CSV at: {combined_csv_path}")
-        
-        if os.path.exists(session_dir):
-            files_in_session = os.listdir(session_dir)
-            print(f"🔍 DEBUG: Files in session directory: {files_in_session}")
-        else:
-            print(f"❌ DEBUG: Session directory does not exist: {session_dir}")
+        logger.debug("🔍 DEBUG: Session directory: %s", session_dir)
+        logger.debug("🔍 DEBUG: Looking for combined CSV at: %s", combined_csv_path)
+        
+        # A combined CSV implies the session directory exists, so the
+        # directory itself is only checked when the CSV is missing
+        has_combined_csv = os.path.exists(combined_csv_path)
+        if not has_combined_csv and not os.path.exists(session_dir):
+            logger.warning("❌ Session directory does not exist: %s", session_dir)
             return False, "Session directory not found"
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("🔍 DEBUG: Files in session directory: %s", os.listdir(session_dir))
         
-        if not os.path.exists(combined_csv_path):
-            print(f"❌ DEBUG: Combined CSV not found at: {combined_csv_path}")
+        if not has_combined_csv:
+            logger.warning("❌ Combined CSV not found at: %s", combined_csv_path)
             
             # **ENHANCED BEHAVIOR**: Check if there are any CSV files from PDF processing
             existing_csv_files = [f for f in os.listdir(session_dir) if f.endswith('.csv')]
             if existing_csv_files:
-                print(f"🔍 DEBUG: Found other CSV files in session: {existing_csv_files}")
+                logger.debug("🔍 DEBUG: Found other CSV files in session: %s", existing_csv_files)
                 
                 # Try to use the first CSV file as the base
                 alternative_csv = os.path.join(session_dir, existing_csv_files[0])
-                print(f"🔄 DEBUG: Attempting to use alternative CSV file: {alternative_csv}")
+                logger.debug("🔄 DEBUG: Attempting to use alternative CSV file: %s", alternative_csv)
                 
                 try:
-                    existing_df = pd.read_csv(alternative_csv, dtype=str)
-                    print(f"✅ DEBUG: Successfully read alternative CSV with {len(existing_df)} rows")
+                    existing_df = read_cached_csv(alternative_csv)
+                    logger.debug("✅ DEBUG: Successfully read alternative CSV with %s rows", len(existing_df))
                 except Exception as e:
-                    print(f"❌ DEBUG: Failed to read alternative CSV: {str(e)}")
+                    logger.warning("❌ Failed to read alternative CSV: %s", str(e))
                     return False, f"Could not read CSV file: {str(e)}"
             else:
-                print(f"❌ DEBUG: No CSV files found in session directory")
+                logger.warning("❌ No CSV files found in session directory")
                 return False, "No PDF data processed yet. Please process PDF first."
         else:
-            print(f"✅ DEBUG: Found combined CSV file: {combined_csv_path}")
-            existing_df = pd.read_csv(combined_csv_path, dtype=str)
-            print(f"✅ DEBUG: Successfully read combined CSV with {len(existing_df)} rows")
+            logger.debug("✅ DEBUG: Found combined CSV file: %s", combined_csv_path)
+            existing_df = read_cached_csv(combined_csv_path)
+            logger.debug("✅ DEBUG: Successfully read combined CSV with %s rows", len(existing_df))
         
         # Ensure matching columns exist in both DataFrames.
-        matching_columns = ["Invoice No.", "Style", "Cartons", "Individual Pieces"]
         for col in matching_columns:
             if col not in existing_df.columns:
                 return False, f"Column '{col}' not found in PDF CSV data."
             if col not in incoming_df.columns:
                 return False, f"Column '{col}' not found in incoming file."
         
-        # Create a composite match key in both DataFrames.
-        def create_match_key(df, cols):
-            return df[cols].fillna('').apply(
-                lambda row: "_".join([str(x).strip().replace(",", "").lower() for x in row]),
-                axis=1
-            )
-        
-        key_cols = matching_columns
-        existing_df["match_key"] = create_match_key(existing_df, key_cols)
-        incoming_df["match_key"] = create_match_key(incoming_df, key_cols)
+        # Existing keys stay a standalone array: the merge only reads the keys
+        # and the mapped columns, so the wide PDF frame never gains (or has to
+        # drop) a helper column.
+        existing_keys = hash_match_keys(create_match_key(existing_df, matching_columns))
         
-        print("Existing DataFrame match keys:")
-        print(existing_df[["Invoice No.", "Style", "Cartons", "Individual Pieces", "match_key"]].head(20))
-        print("Incoming DataFrame match keys:")
-        print(incoming_df[["Invoice No.", "Style", "Cartons", "Individual Pieces", "match_key"]].head(20))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Existing DataFrame match keys:\n%s", existing_df[matching_columns].assign(match_key=existing_keys).head(20))
+            logger.debug("Incoming DataFrame match keys:\n%s", incoming_df[matching_columns + ["match_key"]].head(20))
         
         # Merge: update existing_df rows using incoming additional mapping.
-        for idx, inc_row in incoming_df.iterrows():
-            key = inc_row["match_key"]
-            matches = existing_df[existing_df["match_key"] == key]
-            if not matches.empty:
-                existing_index = matches.index[0]
-                for inc_col, pdf_col in additional_mapping.items():
-                    if inc_col in incoming_df.columns and pdf_col in existing_df.columns:
-                        value = inc_row.get(inc_col, "")
-                        existing_df.at[existing_index, pdf_col] = value
-        
-        # Drop the match_key columns.
-        existing_df.drop(columns=["match_key"], inplace=True)
-        incoming_df.drop(columns=["match_key"], inplace=True)
-        
-        # Compute values for all rows first
+        # Each incoming row updates the first existing row with its key; when
+        # several incoming rows share a key the last one wins.
+        target_pos, source_pos = match_key_positions(
+            existing_keys, incoming_df["match_key"].to_numpy()
+        )
+        # With no matched rows there is nothing to copy, so no column is rebuilt
+        if len(target_pos):
+            for inc_col, pdf_col in additional_mapping.items():
+                if inc_col in incoming_df.columns and pdf_col in existing_df.columns:
+                    values = existing_df[pdf_col].to_numpy(dtype=object, copy=True)
+                    values[target_pos] = incoming_df[inc_col].to_numpy(dtype=object)[source_pos]
+                    existing_df[pdf_col] = values
+        
+        # The merge is done, so group keys can become categoricals: groupby,
+        # masks and string checks then work on small integer codes.
+        for col in ("Invoice No.", "Ship To Name"):
+            if col in existing_df.columns:
+                existing_df[col] = existing_df[col].astype("category")
+        
+        # Compute values for all rows first. A column whose source is present
+        # is rebuilt from scratch (blank except on first rows); otherwise its
+        # existing values are kept outside the first rows.
         if "BOL Cube" in existing_df.columns:
-            pallet_values = existing_df["BOL Cube"].apply(lambda x: compute_pallet(x))
-            existing_df["Pallet"] = ""  # Initialize empty column
+            pallet_values = compute_pallet(existing_df["BOL Cube"])
+            reset_pallet = True
         else:
-            print("Warning: 'BOL Cube' column not found in existing CSV data.")
-            pallet_values = pd.Series([""] * len(existing_df))
+            logger.warning("Warning: 'BOL Cube' column not found in existing CSV data.")
+            pallet_values = pd.Series(np.nan, index=existing_df.index)
+            reset_pallet = False
         
         if "Ship To Name" in existing_df.columns:
-            burlington_values = existing_df.apply(
-                lambda row: compute_burlington(row["Ship To Name"], pallet_values.iloc[row.name]), 
-                axis=1
-            )
-            final_cube_values = existing_df.apply(
-                lambda row: compute_final_cube(row["Ship To Name"], pallet_values.iloc[row.name]), 
-                axis=1
-            )
-            
-            existing_df["Burlington Cube"] = ""  # Initialize empty column
-            existing_df["Final Cube"] = ""      # Initialize empty column
+            # One case-insensitive search serves both cube columns
+            is_burlington = _is_burlington(existing_df["Ship To Name"])
+            burlington_values = compute_burlington(existing_df["Ship To Name"], pallet_values, is_burlington)
+            final_cube_values = compute_final_cube(existing_df["Ship To Name"], pallet_values, is_burlington)
+            reset_cubes = True
         else:
-            print("Warning: 'Ship To Name' column not found in existing CSV data.")
+            logger.warning("Warning: 'Ship To Name' column not found in existing CSV data.")
             burlington_values = pd.Series([""] * len(existing_df))
             final_cube_values = pd.Series([""] * len(existing_df))
+            reset_cubes = False
+        
+        pallet_values = _as_int_column(pallet_values)
+        
+        # Only set the values on the first row of each invoice group, i.e.
+        # wherever Invoice No. differs from the row above (missing never matches).
+        # Each column is built in full and assigned once.
+        invoice_no = existing_df["Invoice No."]
+        first_rows = invoice_no.ne(invoice_no.shift()).to_numpy()
+        for col, col_values, reset in (("Pallet", pallet_values, reset_pallet),
+                                       ("Burlington Cube", burlington_values, reset_cubes),
+                                       ("Final Cube", final_cube_values, reset_cubes)):
+            if reset:
+                values = np.full(len(existing_df), "", dtype=object)
+            else:
+                values = existing_df[col].to_numpy(dtype=object, copy=True)
+            values[first_rows] = col_values.to_numpy(dtype=object)[first_rows]
+            existing_df[col] = values
         
-        # Group by Invoice No. and only set values for first row of each group
-        current_invoice = None
-        is_first_row = True
-        
-        for idx in range(len(existing_df)):
-            invoice_no = existing_df.iloc[idx]["Invoice No."]
-            
-            # Check if this is the first row of a new invoice group
-            if invoice_no != current_invoice:
-                current_invoice = invoice_no
-                is_first_row = True
-            
-            # Only set the values for the first row of each invoice group
-            if is_first_row:
-                existing_df.iloc[idx, existing_df.columns.get_loc("Pallet")] = pallet_values.iloc[idx]
-                existing_df.iloc[idx, existing_df.columns.get_loc("Burlington Cube")] = burlington_values.iloc[idx]
-                existing_df.iloc[idx, existing_df.columns.get_loc("Final Cube")] = final_cube_values.iloc[idx]
-                is_first_row = False
-            
-        def parse_cancel_date(date_str):
-            """
-            Convert a string like '3152025' -> 03/15/2025 or
-            '2202025' -> 02/20/2025 into a datetime object.
-
-            Handles:
-            - 7-digit format:  MDDYYYY  (e.g. '3152025')
-            - 8-digit format: MMDDYYYY  (e.g. '03152025')
-            """
-            date_str = str(date_str).strip()
-
-            # 7-digit: MDDYYYY
-            if len(date_str) == 7:
-                month = date_str[0]             # e.g. '3'
-                day   = date_str[1:3]          # e.g. '15'
-                year  = date_str[3:]           # e.g. '2025'
-                try:
-                    return pd.to_datetime(f"{month.zfill(2)}/{day}/{year}", format="%m/%d/%Y")
-                except:
-                    return pd.NaT
-
-            # 8-digit: MMDDYYYY
-            elif len(date_str) == 8:
-                month = date_str[0:2]          # e.g. '03'
-                day   = date_str[2:4]          # e.g. '15'
-                year  = date_str[4:]           # e.g. '2025'
-                try:
-                    return pd.to_datetime(f"{month}/{day}/{year}", format="%m/%d/%Y")
-                except:
-                    return pd.NaT
-
-            return pd.NaT
-
         # --- Sorting the output ---
         if "Cancel Date" in existing_df.columns and "Ship To Name" in existing_df.columns:
-            # Convert the raw strings in "Cancel Date" to datetime using the custom function:
-            existing_df["Cancel Date_dt"] = existing_df["Cancel Date"].apply(parse_cancel_date)
-
-            # Compute the earliest date per "Ship To Name":
-            existing_df["min_cancel_date"] = existing_df.groupby("Ship To Name")["Cancel Date_dt"].transform("min")
+            # Sort keys live in a small frame of their own, so the wide output
+            # frame is reordered once and never gains (or copies to drop) helper columns.
+            ship_to = existing_df["Ship To Name"]
+            # Convert the raw strings in "Cancel Date" to datetime in one vectorized pass:
+            cancel_dt = parse_cancel_date(existing_df["Cancel Date"])
+            sort_keys = pd.DataFrame({
+                # Earliest date per "Ship To Name":
+                "min_cancel_date": cancel_dt.groupby(ship_to, observed=True).transform("min"),
+                "Ship To Name": ship_to,
+                "Cancel Date_dt": cancel_dt,
+            })
+            sort_keys.index = np.arange(len(sort_keys))
 
             # Sort by earliest group date, then Ship To Name, then the individual date:
-            existing_df.sort_values(by=["min_cancel_date", "Ship To Name", "Cancel Date_dt"], inplace=True)
-
-            # Drop the helper columns:
-            existing_df.drop(columns=["min_cancel_date", "Cancel Date_dt"], inplace=True)
+            order = sort_keys.sort_values(by=["min_cancel_date", "Ship To Name", "Cancel Date_dt"]).index
+            existing_df = existing_df.iloc[order]
 
         else:
-            print("Warning: 'Cancel Date' or 'Ship To Name' column not found; skipping sort.")
+            logger.warning("Warning: 'Cancel Date' or 'Ship To Name' column not found; skipping sort.")
         
         # Save updated DataFrame back to the combined CSV in session directory
-        existing_df.to_csv(combined_csv_path, index=False)
+        write_csv_file(existing_df, combined_csv_path)
+        write_parquet_sidecar(existing_df, combined_csv_path)
+        cache_csv_frame(combined_csv_path, existing_df)
         
-        return True, f"CSV data merged successfully (processed {len(incoming_df)} rows)"
+        return True, f"CSV data merged successfully (processed {incoming_rows} rows)"
         
     except pd.errors.EmptyDataError:
         return False, "The uploaded file is empty"
     except pd.errors.ParserError:
         return False, "Error parsing the file. Please ensure it's a valid CSV/Excel file"
     except Exception as e:
-        print(f"Error processing CSV: {str(e)}")
+        logger.error("Error processing CSV: %s", e)
         return False, f"Error processing file: {str(e)}"
 
+def normalize_match_column(values):
+    """Strip, drop commas and lowercase a match column ("" for missing values).
+
+    Match columns repeat heavily (invoice numbers, styles, carton counts), so
+    the column is factorized like a categorical and the string ops run once
+    per distinct value; the integer codes then expand the result to all rows.
+    """
+    if pd.api.types.infer_dtype(values, skipna=True) not in ('string', 'empty'):
+        # factorize treats 12 and 12.0 as one value; keep their distinct str() forms
+        values = values.astype(str).where(values.notna())
+    codes, uniques = pd.factorize(values)
+    cleaned = pd.Series(uniques, dtype=object).astype(str).str.strip().str.replace(",", "", regex=False).str.lower()
+    # Missing values have code -1, which picks the trailing ""
+    return pd.Series(np.append(cleaned.to_numpy(dtype=object), "")[codes], index=values.index)
+
+def hash_match_keys(keys):
+    """Hash composite match-key strings to uint64 so the join compares integers."""
+    hashed = pd.util.hash_pandas_object(keys, index=False).to_numpy()
+    if logger.isEnabledFor(logging.DEBUG) and len(pd.unique(hashed)) != keys.nunique():
+        logger.warning("⚠️ match_key hash collision detected")
+    return hashed
+
+def match_key_positions(existing_keys, incoming_keys):
+    """Pair incoming rows with the first existing row sharing their match key.
+
+    Uses a binary search over the sorted existing keys instead of a hash join.
+    Returns (existing positions, incoming positions); for duplicate incoming
+    keys only the last occurrence is kept.
+    """
+    if len(existing_keys) == 0 or len(incoming_keys) == 0:
+        empty = np.empty(0, dtype=np.intp)
+        return empty, empty
+    # Stable sort keeps equal keys in row order, so searchsorted lands on the first one
+    order = np.argsort(existing_keys, kind="stable")
+    sorted_keys = existing_keys[order]
+    idx = np.searchsorted(sorted_keys, incoming_keys)
+    found = sorted_keys[np.minimum(idx, len(sorted_keys) - 1)] == incoming_keys
+    found &= ~pd.Series(incoming_keys).duplicated(keep="last").to_numpy()
+    return order[idx[found]], np.flatnonzero(found)
+
+def _as_int_column(values):
+    """Render a numeric Series as integers, using "" for missing values."""
+    return values.astype("Int64").astype(str).where(values.notna(), "")
+
+def _is_burlington(ship_to_names):
+    """Flag Ship To Names that contain "burlington" (case-insensitive)."""
+    return ship_to_names.str.contains("burlington", case=False, regex=False, na=False)
+
 def compute_pallet(bol_cube):
-    """Compute pallet value from BOL Cube."""
-    try:
-        value = float(str(bol_cube).replace(",", "").strip())
-        return math.ceil(value / 80)
-    except Exception:
-        return ""
+    """Compute pallet values from a BOL Cube column (NaN where not numeric)."""
+    values = pd.to_numeric(
+        bol_cube.astype(str).str.replace(",", "", regex=False).str.strip(),
+        errors="coerce"
+    )
+    pallets = np.ceil(values / 80)
+    return pallets.where(np.isfinite(pallets))
 
-def compute_burlington(ship_to_name, pallet):
-    """Compute Burlington Cube value."""
-    try:
-        if isinstance(ship_to_name, str) and "burlington" in ship_to_name.lower():
-            if pd.isna(pallet) or pallet == "":
-                return ""
-            return int(pallet) * 93
-    except Exception:
-        return ""
-    return ""
+def compute_burlington(ship_to_name, pallet, is_burlington=None):
+    """Compute Burlington Cube values for Burlington ship-to rows.
 
-def compute_final_cube(ship_to_name, pallet):
-    """Compute Final Cube value."""
-    try:
-        if isinstance(ship_to_name, str) and "burlington" not in ship_to_name.lower():
-            if pd.isna(pallet) or pallet == "":
-                return ""
-            return int(pallet) * 130
-    except Exception:
-        return ""
-    return ""
+    Pass is_burlington (from _is_burlington) to reuse an existing mask.
+    """
+    if is_burlington is None:
+        is_burlington = _is_burlington(ship_to_name)
+    # Missing names never match, so the mask already excludes them
+    return _as_int_column((pallet * 93).where(is_burlington))
+
+def compute_final_cube(ship_to_name, pallet, is_burlington=None):
+    """Compute Final Cube values for non-Burlington ship-to rows.
+
+    Pass is_burlington (from _is_burlington) to reuse an existing mask.
+    """
+    if is_burlington is None:
+        is_burlington = _is_burlington(ship_to_name)
+    mask = ship_to_name.notna() & ~is_burlington
+    return _as_int_column((pallet * 130).where(mask))
+
+def parse_cancel_date(dates):
+    """
+    Convert strings like '3152025' -> 03/15/2025 or
+    '2202025' -> 02/20/2025 into datetimes.
+
+    Handles:
+    - 7-digit format:  MDDYYYY  (e.g. '3152025')
+    - 8-digit format: MMDDYYYY  (e.g. '03152025')
+
+    Zero-padding to 8 characters turns MDDYYYY into MMDDYYYY, so the whole
+    column is parsed with a single format. Anything else becomes NaT.
+    """
+    dates = dates.astype(str).str.strip()
+    dates = dates.where(dates.str.len().isin([7, 8])).str.zfill(8)
+    if _cancel_date_days is not None:
+        try:
+            digits = dates.fillna("").to_numpy(dtype="S8").view(np.uint8).reshape(-1, 8)
+        except UnicodeEncodeError:
+            digits = None
+        if digits is not None:
+            days = _cancel_date_days(digits)
+            parsed = days.astype("datetime64[D]").astype("datetime64[ns]")
+            parsed[days == _DATE_INVALID] = np.datetime64("NaT")
+            # Rows the kernel can't decide on exactly go through pandas
+            undecided = days == _DATE_UNDECIDED
+            if undecided.any():
+                parsed[undecided] = pd.to_datetime(
+                    dates[undecided], format="%m%d%Y", errors="coerce"
+                ).to_numpy()
+            return pd.Series(parsed, index=dates.index, name=dates.name)
+    return pd.to_datetime(dates, format="%m%d%Y", errors="coerce")
+
+# Sentinel day counts returned by _cancel_date_days
+_DATE_INVALID = -(2 ** 40)
+_DATE_UNDECIDED = _DATE_INVALID - 1
+
+if njit is not None:
+    _DAYS_IN_MONTH = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+    @njit(cache=True)
+    def _cancel_date_days(digits):
+        """Days since 1970-01-01 for rows of MMDDYYYY ASCII digits.
+
+        _DATE_INVALID marks an invalid date (NaT); _DATE_UNDECIDED marks rows
+        with non-digits or a year outside the datetime64[ns] range, which are
+        left to pandas.
+        """
+        out = np.empty(digits.shape[0], np.int64)
+        for i in range(digits.shape[0]):
+            row = digits[i]
+            all_digits = True
+            for j in range(8):
+                if row[j] < 48 or row[j] > 57:
+                    all_digits = False
+            if not all_digits:
+                out[i] = _DATE_UNDECIDED
+                continue
+            month = (row[0] - 48) * 10 + (row[1] - 48)
+            day = (row[2] - 48) * 10 + (row[3] - 48)
+            year = ((row[4] - 48) * 1000 + (row[5] - 48) * 100
+                    + (row[6] - 48) * 10 + (row[7] - 48))
+            if year < 1678 or year > 2261:
+                out[i] = _DATE_UNDECIDED
+                continue
+            if month < 1 or month > 12 or day < 1:
+                out[i] = _DATE_INVALID
+                continue
+            month_days = _DAYS_IN_MONTH[month - 1]
+            if month == 2 and year % 4 == 0 and (year % 100 != 0 or year % 400 == 0):
+                month_days += 1
+            if day > month_days:
+                out[i] = _DATE_INVALID
+                continue
+            # Civil date -> day count (H. Hinnant's days_from_civil)
+            y = year - 1 if month <= 2 else year
+            era = y // 400
+            yoe = y - era * 400
+            doy = (153 * ((month + 9) % 12) + 2) // 5 + day - 1
+            doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+            out[i] = era * 146097 + doe - 719468
+        return out
+else:
+    _cancel_date_days = None
 
 def cleanup_old_files():
     """Clean up old PDFs and combined CSV file when page is loaded/refreshed."""
+    with _csv_cache_lock:
+        _csv_cache.clear()
     try:
         script_dir = app.config['UPLOAD_FOLDER']
         
         # Delete old PDFs
-        for file in os.listdir(script_dir):
-            if file.lower().endswith('.pdf'):
-                try:
-                    os.remove(os.path.join(script_dir, file))
-                    print(f"Cleaned up old PDF: {file}")
-                except Exception as e:
-                    print(f"Error deleting PDF {file}: {str(e)}")
+        with os.scandir(script_dir) as entries:
+            for entry in entries:
+                if entry.name.lower().endswith('.pdf') and entry.is_file():
+                    try:
+                        os.remove(entry.path)
+                        logger.info("Cleaned up old PDF: %s", entry.name)
+                    except Exception as e:
+                        logger.error("Error deleting PDF %s: %s", entry.name, e)
         
-        # Delete old combined CSV
+        # Delete old combined CSV (a missing file is the usual case, not an error)
         combined_csv = os.path.join(script_dir, OUTPUT_CSV_NAME)
-        if os.path.exists(combined_csv):
+        for path in (combined_csv, parquet_sidecar_path(combined_csv)):
             try:
-                os.remove(combined_csv)
-                print(f"Cleaned up old combined CSV: {OUTPUT_CSV_NAME}")
+                os.remove(path)
+                logger.info("Cleaned up old combined CSV: %s", os.path.basename(path))
+            except FileNotFoundError:
+                pass
             except Exception as e:
-                print(f"Error deleting combined CSV: {str(e)}")
+                logger.error("Error deleting combined CSV: %s", e)
                 
     except Exception as e:
-        print(f"Error during cleanup: {str(e)}")
+        logger.error("Error during cleanup: %s", e)
+
+def session_dir_for(session_id):
+    """Path of the processing directory for session_id."""
+    return os.path.join(app.config['UPLOAD_FOLDER'], 'processing_sessions', session_id)
+
+def peek_session_id():
+    """Session ID this request refers to, or None; never creates or cleans a session.
+
+    Read-only endpoints use this instead of get_or_create_session() so polling
+    doesn't build a DataProcessor (mkdir) or wipe an external session's files.
+    """
+    return request.args.get('_sid') or request.args.get('session_id') or session.get('session_id')
 
 def get_or_create_session():
+    """Return this request's processor, building it on first use.
+
+    The processor is memoized on ``flask.g`` so helpers that call this again
+    within the same request don't redo the session lookup, directory setup
+    or external-session cleanup.
+    """
+    processor = getattr(g, '_processor', None)
+    if processor is None:
+        processor = g._processor = _build_processor()
+    return processor
+
+
+def _build_processor():
     """Get existing processor or create new one with session management."""
     # Check for action parameter to force new session creation
     action = request.args.get('_action')
@@ -371,47 +1093,53 @@ def get_or_create_session():
     # If force new session is requested, always create a new session
     if force_new_session:
         processor = DataProcessor()  # Creates new session
-        print(f"🆕 Force creating new session due to _action=new_session: {processor.session_id}")
+        logger.info("🆕 Force creating new session due to _action=new_session: %s", processor.session_id)
         return processor
     
     # **CRITICAL FIX**: For external sessions, always use the provided ID without reuse logic
     if external_session_id:
         # Always create/use the exact session ID provided by external apps
-        session_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'processing_sessions', external_session_id)
-        
-        # **SESSION CONTAMINATION FIX**: Automatically clean existing session directory
-        if os.path.exists(session_dir):
-            old_files = [f for f in os.listdir(session_dir) if not f.startswith('.')]
+        session_dir = session_dir_for(external_session_id)
+        
+        # **SESSION CONTAMINATION FIX**: Automatically clean existing session directory.
+        # Sessions with a background job still running keep their files so
+        # requests made meanwhile don't wipe the job's input or output. A
+        # finished job's record and the Parquet copy go with the other files.
+        if pipeline_job_running(external_session_id):
+            logger.info("⏳ Session %s belongs to a running background job; skipping cleanup", external_session_id)
+        elif os.path.exists(session_dir):
+            with os.scandir(session_dir) as entries:
+                old_files = [e for e in entries
+                             if (not e.name.startswith('.') or e.name in SESSION_STATE_FILES) and e.is_file()]
             if old_files:
-                print(f"🧹 AUTOMATIC CLEANUP: External session {external_session_id} contains old files: {old_files}")
-                print(f"🧹 Removing all files to prevent contamination...")
+                logger.info("🧹 AUTOMATIC CLEANUP: External session %s contains old files: %s", external_session_id, [e.name for e in old_files])
+                logger.info("🧹 Removing all files to prevent contamination...")
                 
                 # Remove ALL files in the session directory
                 for old_file in old_files:
-                    old_file_path = os.path.join(session_dir, old_file)
                     try:
-                        os.remove(old_file_path)
-                        print(f"🗑️ Removed contaminated file: {old_file}")
+                        os.remove(old_file.path)
+                        logger.info("🗑️ Removed contaminated file: %s", old_file.name)
                     except Exception as e:
-                        print(f"⚠️ Could not remove {old_file}: {str(e)}")
+                        logger.warning("⚠️ Could not remove %s: %s", old_file.name, e)
                 
-                print(f"✅ Session directory cleaned: {external_session_id}")
+                logger.info("✅ Session directory cleaned: %s", external_session_id)
             else:
-                print(f"✅ External session directory is clean: {external_session_id}")
+                logger.info("✅ External session directory is clean: %s", external_session_id)
         else:
-            print(f"🆕 Creating new external session directory: {external_session_id}")
+            logger.info("🆕 Creating new external session directory: %s", external_session_id)
         
         # Create processor with the cleaned session ID
         try:
             processor = DataProcessor(session_id=external_session_id)
-            print(f"🔒 External session isolated and ready: {external_session_id}")
+            logger.info("🔒 External session isolated and ready: %s", external_session_id)
             return processor
         except Exception as e:
-            print(f"❌ Failed to create external session {external_session_id}: {str(e)}")
+            logger.error("❌ Failed to create external session %s: %s", external_session_id, e)
             # Fall back to creating a new session
-            print("🔄 Falling back to creating a new session...")
+            logger.info("🔄 Falling back to creating a new session...")
             processor = DataProcessor()
-            print(f"🆕 Fallback session created: {processor.session_id}")
+            logger.info("🆕 Fallback session created: %s", processor.session_id)
         return processor
     
     # For internal Flask sessions (web UI), use simple logic
@@ -419,13 +1147,13 @@ def get_or_create_session():
         # Create new internal session
         processor = DataProcessor()
         session['session_id'] = processor.session_id
-        print(f"🆕 Created new internal session: {processor.session_id}")
+        logger.info("🆕 Created new internal session: %s", processor.session_id)
         return processor
     else:
         # Use existing internal session
         internal_session_id = session['session_id']
         processor = DataProcessor(session_id=internal_session_id)
-        print(f"♻️ Reusing internal session: {internal_session_id}")
+        logger.info("♻️ Reusing internal session: %s", internal_session_id)
     return processor
 
 @app.route('/', methods=['GET'])
@@ -493,68 +1221,41 @@ def upload_file():
     # Get existing processor with session directory
     processor = get_or_create_session()
     
-    print(f"📤 PDF Upload Request - Session: {processor.session_id}")
+    logger.info("📤 PDF Upload Request - Session: %s", processor.session_id)
     
     if 'file' not in request.files:
-        print("❌ No file part in request")
+        logger.error("❌ No file part in request")
         return jsonify({'error': 'No file part in request'}), 400
         
     file = request.files['file']
     if file.filename == '':
-        print("❌ No file selected")
+        logger.error("❌ No file selected")
         return jsonify({'error': 'No file selected'}), 400
         
     if not allowed_file(file.filename, ALLOWED_PDF_EXTENSIONS):
-        print(f"❌ Invalid file type: {file.filename}")
+        logger.error("❌ Invalid file type: %s", file.filename)
         return jsonify({'error': 'Invalid file type (PDF required)'}), 400
         
     try:
         # **SESSION ISOLATION**: Session is now guaranteed clean by get_or_create_session()
-        print(f"📁 Session directory verified clean: {processor.session_dir}")
+        logger.info("📁 Session directory verified clean: %s", processor.session_dir)
         
         # Save the uploaded PDF directly to session directory
         filename = secure_filename(file.filename)
         file_path = os.path.join(processor.session_dir, filename)
         file.save(file_path)
         
-        print(f"📏 Saved PDF size: {os.path.getsize(file_path)} bytes")
-        print(f"📄 PDF saved to: {file_path}")
-        print(f"📁 Session directory: {processor.session_dir}")
+        logger.info("📏 Saved PDF size: %s bytes", os.path.getsize(file_path))
+        logger.info("📄 PDF saved to: %s", file_path)
+        logger.info("📁 Session directory: %s", processor.session_dir)
         
         # Process the PDF through our pipeline
-        print("🔄 Initializing PDF processor...")
-        pdf_processor = PDFProcessor(session_dir=processor.session_dir)
-        
-        print("🔄 Processing PDF...")
-        if not pdf_processor.process_first_pdf():
-            print("❌ PDF processing failed - check logs for details")
-            return jsonify({
-                'error': 'PDF processing failed',
-                'details': 'Could not extract text from PDF. Check server logs for more details.',
-                'session_id': processor.session_id
-            }), 500
-        
-        print("🔄 Processing extracted text files...")
-        if not processor.process_all_files():
-            print("❌ Text processing failed - check logs for details")
-            return jsonify({
-                'error': 'Text processing failed',
-                'details': 'Could not process extracted text files. Check server logs for more details.',
-                'session_id': processor.session_id
-            }), 500
-            
-        # Create exporter with the same session directory
-        print("🔄 Creating final CSV...")
-        exporter = CSVExporter(session_dir=processor.session_dir)
-        if not exporter.combine_to_csv():
-            print("❌ CSV creation failed - check logs for details")
-            return jsonify({
-                'error': 'CSV creation failed',
-                'details': 'Could not create final CSV file. Check server logs for more details.',
-                'session_id': processor.session_id
-            }), 500
+        logger.info("🔄 Processing PDF into the combined CSV...")
+        runner = make_pipeline_runner(processor)
+        if not runner.run():
+            return pipeline_error_response(runner, processor)
             
-        print("✅ PDF processed successfully!")
+        logger.info("✅ PDF processed successfully!")
         return jsonify({
             'message': 'PDF processed successfully',
             'filename': filename,
@@ -563,7 +1264,7 @@ def upload_file():
         
     except Exception as e:
         error_msg = str(e)
-        print(f"❌ Unexpected error during PDF processing: {error_msg}")
+        logger.error("❌ Unexpected error during PDF processing: %s", error_msg)
         return jsonify({
             'error': 'Unexpected error during PDF processing',
             'details': error_msg,
@@ -577,12 +1278,12 @@ def upload_base64():
         # Get existing processor with session directory
         processor = get_or_create_session()
         
-        print(f"📤 Base64 Upload Request - Session: {processor.session_id}")
+        logger.info("📤 Base64 Upload Request - Session: %s", processor.session_id)
         
         # Parse JSON request
-        data = request.get_json()
+        data = request.get_json(cache=False)  # Parsed payload only; the raw body is not kept alongside it
         if not data:
-            print("❌ No JSON data provided")
+            logger.error("❌ No JSON data provided")
             return jsonify({'error': 'No JSON data provided'}), 400
             
         # Get file data from request
@@ -590,22 +1291,14 @@ def upload_base64():
         filename = data.get('filename') or data.get('name', 'attachment.pdf')
         
         if not file_data:
-            print("❌ No file data provided")
+            logger.error("❌ No file data provided")
             return jsonify({'error': 'No file data provided'}), 400
         
         # **SESSION ISOLATION**: Session is now guaranteed clean by get_or_create_session()
-        print(f"📁 Session directory verified clean for base64 upload: {processor.session_dir}")
+        logger.info("📁 Session directory verified clean for base64 upload: %s", processor.session_dir)
 
         # Handle base64 encoded data
-        import base64
         try:
-            # Remove data URL prefix if present
-            if ',' in file_data:
-                file_data = file_data.split(',')[1]
-            
-            # Decode base64 data
-            decoded_data = base64.b64decode(file_data)
-            
             # Secure filename
             filename = secure_filename(filename)
             
@@ -613,62 +1306,38 @@ def upload_base64():
             if not filename.lower().endswith('.pdf'):
                 filename += '.pdf'
             
-            # Save file to session directory
+            # Remove data URL prefix if present and decode straight into the session directory
+            payload = strip_data_url_prefix(file_data)
+            decoded_size = base64_decoded_size(payload)
+            if decoded_size > MAX_PDF_BYTES:
+                return pdf_too_large_response(decoded_size)
             file_path = os.path.join(processor.session_dir, filename)
-            with open(file_path, 'wb') as f:
-                f.write(decoded_data)
+            file_size = write_base64_file(file_path, payload)
             
-            print(f"📄 Base64 PDF saved to: {file_path} ({len(decoded_data)} bytes)")
-            print(f"📁 Session directory: {processor.session_dir}")
+            logger.info("📄 Base64 PDF saved to: %s (%s bytes)", file_path, file_size)
+            logger.info("📁 Session directory: %s", processor.session_dir)
             
             # Process the PDF through our pipeline
-            print("🔄 Initializing PDF processor...")
-            pdf_processor = PDFProcessor(session_dir=processor.session_dir)
-            
-            print("🔄 Processing PDF...")
-            if not pdf_processor.process_first_pdf():
-                print("❌ PDF processing failed - check logs for details")
-                return jsonify({
-                    'error': 'PDF processing failed',
-                    'details': 'Could not extract text from PDF. Check server logs for more details.',
-                    'session_id': processor.session_id
-                }), 500
-                
-            print("🔄 Processing extracted text files...")
-            if not processor.process_all_files():
-                print("❌ Text processing failed - check logs for details")
-                return jsonify({
-                    'error': 'Text processing failed',
-                    'details': 'Could not process extracted text files. Check server logs for more details.',
-                    'session_id': processor.session_id
-                }), 500
+            logger.info("🔄 Processing PDF into the combined CSV...")
+            runner = make_pipeline_runner(processor)
+            if not runner.run():
+                return pipeline_error_response(runner, processor)
                 
-            # Create exporter with the same session directory
-            print("🔄 Creating final CSV...")
-            exporter = CSVExporter(session_dir=processor.session_dir)
-            if not exporter.combine_to_csv():
-                print("❌ CSV creation failed - check logs for details")
-                return jsonify({
-                    'error': 'CSV creation failed',
-                    'details': 'Could not create final CSV file. Check server logs for more details.',
-                    'session_id': processor.session_id
-                }), 500
-                
-            print("✅ Base64 PDF processed successfully!")
+            logger.info("✅ Base64 PDF processed successfully!")
             return jsonify({
                 'message': 'Base64 PDF processed successfully',
                 'filename': filename,
-                'file_size': len(decoded_data),
+                'file_size': file_size,
                 'session_id': processor.session_id
             }), 200
             
         except Exception as decode_error:
-            print(f"❌ Failed to decode base64 data: {str(decode_error)}")
+            logger.error("❌ Failed to decode base64 data: %s", decode_error)
             return jsonify({'error': f'Failed to decode file data: {str(decode_error)}'}), 400
             
     except Exception as e:
         error_msg = str(e)
-        print(f"❌ Unexpected error during base64 upload: {error_msg}")
+        logger.error("❌ Unexpected error during base64 upload: %s", error_msg)
         return jsonify({
             'error': 'Unexpected error during base64 upload',
             'details': error_msg,
@@ -682,49 +1351,44 @@ def upload_attachment():
         # Get existing processor with session directory
         processor = get_or_create_session()
         
-        print(f"📤 Attachment Upload Request - Session: {processor.session_id}")
-        
-        # Try to get data from different sources
-        data = None
-        
-        # Check if it's JSON data
-        if request.is_json:
-            data = request.get_json()
-        elif request.form:
-            # Form data
-            data = request.form.to_dict()
-        
-        if not data:
-            print("❌ No data provided")
-            return jsonify({'error': 'No data provided'}), 400
-        
-        # Get file information
-        attachment_data = data.get('attachmentData') or data.get('file_data') or data.get('data')
-        filename = data.get('filename') or data.get('name', 'attachment.pdf')
+        logger.info("📤 Attachment Upload Request - Session: %s", processor.session_id)
         
-        if not attachment_data:
-            print("❌ No attachment data provided")
-            return jsonify({'error': 'No attachment data provided'}), 400
+        # A raw multipart file part skips base64 entirely
+        upload = request.files.get('file')
+        if upload is not None:
+            attachment_data = None
+            filename = request.form.get('filename') or upload.filename or 'attachment.pdf'
+        else:
+            # Try to get data from different sources
+            data = None
+            
+            # Check if it's JSON data
+            if request.is_json:
+                data = request.get_json(cache=False)
+            elif request.form:
+                # Form data
+                data = request.form.to_dict()
+            
+            if not data:
+                logger.error("❌ No data provided")
+                return jsonify({'error': 'No data provided'}), 400
+            
+            # Get file information
+            attachment_data = data.get('attachmentData') or data.get('file_data') or data.get('data')
+            filename = data.get('filename') or data.get('name', 'attachment.pdf')
+            
+            if not attachment_data:
+                logger.error("❌ No attachment data provided")
+                return jsonify({'error': 'No attachment data provided'}), 400
         
         # **SESSION ISOLATION**: Session is now guaranteed clean by get_or_create_session()
-        print(f"📁 Session directory verified clean for attachment upload: {processor.session_dir}")
+        logger.info("📁 Session directory verified clean for attachment upload: %s", processor.session_dir)
 
         # Handle different data formats
-        import base64
         try:
-            # If it's already bytes, use as is
-            if isinstance(attachment_data, bytes):
-                file_bytes = attachment_data
-            else:
-                # Try to decode as base64
-                if isinstance(attachment_data, str):
-                    # Remove data URL prefix if present
-                    if ',' in attachment_data:
-                        attachment_data = attachment_data.split(',')[1]
-                    file_bytes = base64.b64decode(attachment_data)
-                else:
-                    print("❌ Invalid attachment data format")
-                    return jsonify({'error': 'Invalid attachment data format'}), 400
+            if upload is None and not isinstance(attachment_data, (bytes, str)):
+                logger.error("❌ Invalid attachment data format")
+                return jsonify({'error': 'Invalid attachment data format'}), 400
             
             # Secure filename
             filename = secure_filename(filename)
@@ -735,61 +1399,56 @@ def upload_attachment():
             
             # Save file to session directory
             file_path = os.path.join(processor.session_dir, filename)
-            with open(file_path, 'wb') as f:
-                f.write(file_bytes)
+            if upload is not None:
+                # Stream the binary file part straight to disk; the part's own
+                # Content-Length is rarely sent, so check the saved size too
+                if (upload.content_length or 0) > MAX_PDF_BYTES:
+                    return pdf_too_large_response(upload.content_length)
+                upload.save(file_path)
+                file_size = os.path.getsize(file_path)
+                if file_size > MAX_PDF_BYTES:
+                    os.remove(file_path)
+                    return pdf_too_large_response(file_size)
+            elif isinstance(attachment_data, bytes):
+                # If it's already bytes, use as is
+                write_file_bytes(file_path, attachment_data)
+                file_size = len(attachment_data)
+            else:
+                # Remove data URL prefix if present and decode base64 straight to disk
+                payload = strip_data_url_prefix(attachment_data)
+                decoded_size = base64_decoded_size(payload)
+                if decoded_size > MAX_PDF_BYTES:
+                    return pdf_too_large_response(decoded_size)
+                file_size = write_base64_file(file_path, payload)
             
-            print(f"📄 Attachment saved to: {file_path} ({len(file_bytes)} bytes)")
-            print(f"📁 Session directory: {processor.session_dir}")
+            logger.info("📄 Attachment saved to: %s (%s bytes)", file_path, file_size)
+            logger.info("📁 Session directory: %s", processor.session_dir)
             
-            # Process the PDF through our pipeline
-            print("🔄 Initializing PDF processor...")
-            pdf_processor = PDFProcessor(session_dir=processor.session_dir)
+            if wants_async():
+                return start_pipeline_job(processor)
             
-            print("🔄 Processing PDF...")
-            if not pdf_processor.process_first_pdf():
-                print("❌ PDF processing failed - check logs for details")
-                return jsonify({
-                    'error': 'PDF processing failed',
-                    'details': 'Could not extract text from PDF. Check server logs for more details.',
-                    'session_id': processor.session_id
-                }), 500
-                
-            print("🔄 Processing extracted text files...")
-            if not processor.process_all_files():
-                print("❌ Text processing failed - check logs for details")
-                return jsonify({
-                    'error': 'Text processing failed',
-                    'details': 'Could not process extracted text files. Check server logs for more details.',
-                    'session_id': processor.session_id
-                }), 500
-                
-            # Create exporter with the same session directory
-            print("🔄 Creating final CSV...")
-            exporter = CSVExporter(session_dir=processor.session_dir)
-            if not exporter.combine_to_csv():
-                print("❌ CSV creation failed - check logs for details")
-                return jsonify({
-                    'error': 'CSV creation failed',
-                    'details': 'Could not create final CSV file. Check server logs for more details.',
-                    'session_id': processor.session_id
-                }), 500
+            # Process the PDF through our pipeline
+            logger.info("🔄 Processing PDF into the combined CSV...")
+            runner = make_pipeline_runner(processor)
+            if not runner.run():
+                return pipeline_error_response(runner, processor)
                 
-            print("✅ Attachment processed successfully!")
+            logger.info("✅ Attachment processed successfully!")
             return jsonify({
                 'message': 'Attachment processed successfully',
                 'filename': filename,
-                'file_size': len(file_bytes),
+                'file_size': file_size,
                 'session_id': processor.session_id,
                 'status': 'success'
             }), 200
             
         except Exception as decode_error:
-            print(f"❌ Failed to process attachment data: {str(decode_error)}")
+            logger.error("❌ Failed to process attachment data: %s", decode_error)
             return jsonify({'error': f'Failed to process attachment data: {str(decode_error)}'}), 400
             
     except Exception as e:
         error_msg = str(e)
-        print(f"❌ Unexpected error during attachment upload: {error_msg}")
+        logger.error("❌ Unexpected error during attachment upload: %s", error_msg)
         return jsonify({
             'error': 'Unexpected error during attachment upload',
             'details': error_msg,
@@ -802,13 +1461,20 @@ def upload_csv():
         # Get existing processor with session directory
         processor = get_or_create_session()
         
-        print(f"📄 CSV Upload Request - Session: {processor.session_id}")
-        print(f"Content-Type: {request.content_type}")
-        print(f"Request method: {request.method}")
-        print(f"Files: {list(request.files.keys())}")
-        print(f"Form data: {list(request.form.keys())}")
-        print(f"JSON data: {request.is_json}")
-        
+        logger.info("📄 CSV Upload Request - Session: %s", processor.session_id)
+        if logger.isEnabledFor(logging.DEBUG):
+            # request.files/request.form parse the body, so only touch them when logged
+            logger.debug("Content-Type: %s", request.content_type)
+            logger.debug("Request method: %s", request.method)
+            logger.debug("Files: %s", list(request.files.keys()))
+            logger.debug("Form data: %s", list(request.form.keys()))
+            logger.debug("JSON data: %s", request.is_json)
+        
+        # Uploads already in memory (or in a request stream) are handed to
+        # process_csv_file directly; only base64 data URLs go through a temp
+        # file, so the decoded payload is never held in memory in full.
+        source = None
+        filename = None
         file_path = None
         
         try:
@@ -819,72 +1485,46 @@ def upload_csv():
                     if not allowed_file(file.filename, ALLOWED_CSV_EXTENSIONS):
                         return jsonify({'error': 'Invalid file type. Please upload a CSV or Excel file'}), 400
                     
-                    filename = secure_filename(f"temp_{file.filename}")
-                    file_path = os.path.join(processor.session_dir, filename)
-                    file.save(file_path)
-                    print(f"✅ CSV file saved via multipart upload")
+                    source, filename = file.stream, file.filename
+                    logger.info("✅ CSV file received via multipart upload")
                     
             # Method 2: Handle JSON data with CSV content
             elif request.is_json:
-                json_data = request.get_json()
-                print(f"📄 JSON data keys: {list(json_data.keys()) if json_data else 'None'}")
+                json_data = request.get_json(cache=False)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("📄 JSON data keys: %s", list(json_data.keys()) if json_data else 'None')
                 
                 if json_data and 'csv_data' in json_data:
-                    csv_content = json_data['csv_data']
+                    source = StringIO(json_data['csv_data'])
                     filename = json_data.get('filename', 'uploaded_data.csv')
-                    
-                    # Save CSV content to file
-                    filename = secure_filename(f"temp_{filename}")
-                    file_path = os.path.join(processor.session_dir, filename)
-                    
-                    with open(file_path, 'w', newline='', encoding='utf-8') as f:
-                        f.write(csv_content)
-                    print(f"✅ CSV data saved from JSON")
+                    logger.info("✅ CSV data received from JSON")
                     
                 elif json_data and 'file_data' in json_data:
                     # Handle base64 encoded CSV
-                    import base64
                     file_data = json_data['file_data']
                     filename = json_data.get('filename', 'uploaded_data.csv')
                     
                     # Decode base64 if needed
                     if isinstance(file_data, str) and file_data.startswith('data:'):
-                        # Handle data URL format
-                        header, data = file_data.split(',', 1)
-                        csv_content = base64.b64decode(data).decode('utf-8')
+                        # Handle data URL format; decoded straight to disk in chunks
+                        file_path = write_temp_upload(processor.session_dir, filename,
+                                                      strip_data_url_prefix(file_data))
+                        source = file_path
                     else:
-                        csv_content = file_data
-                    
-                    filename = secure_filename(f"temp_{filename}")
-                    file_path = os.path.join(processor.session_dir, filename)
-                    
-                    with open(file_path, 'w', newline='', encoding='utf-8') as f:
-                        f.write(csv_content)
-                    print(f"✅ CSV data saved from base64")
+                        source = StringIO(file_data) if isinstance(file_data, str) else BytesIO(file_data)
+                    logger.info("✅ CSV data received from base64")
                     
             # Method 3: Handle raw CSV data in form field
             elif 'csv_data' in request.form:
-                csv_content = request.form['csv_data']
+                source = StringIO(request.form['csv_data'])
                 filename = request.form.get('filename', 'uploaded_data.csv')
-                
-                filename = secure_filename(f"temp_{filename}")
-                file_path = os.path.join(processor.session_dir, filename)
-                
-                with open(file_path, 'w', newline='', encoding='utf-8') as f:
-                    f.write(csv_content)
-                print(f"✅ CSV data saved from form field")
+                logger.info("✅ CSV data received from form field")
                 
             # Method 4: Handle raw CSV data in request body
             elif request.content_type and 'text/csv' in request.content_type:
-                csv_content = request.get_data(as_text=True)
-                filename = 'uploaded_data.csv'
-                
-                filename = secure_filename(f"temp_{filename}")
-                file_path = os.path.join(processor.session_dir, filename)
-                
-                with open(file_path, 'w', newline='', encoding='utf-8') as f:
-                    f.write(csv_content)
-                print(f"✅ CSV data saved from raw body")
+                # Parse the body straight from the request stream
+                source, filename = request.stream, 'uploaded_data.csv'
+                logger.info("✅ CSV data received from raw body")
                 
             else:
                 return jsonify({
@@ -898,9 +1538,9 @@ def upload_csv():
                     ]
                 }), 400
             
-            # Process the CSV file
-            if file_path and os.path.exists(file_path):
-                success, message = process_csv_file(file_path, processor.session_dir)
+            # Process the CSV data
+            if source is not None:
+                success, message = process_csv_file(source, processor.session_dir, filename=filename)
                 
                 if not success:
                     return jsonify({'error': message}), 400
@@ -917,21 +1557,30 @@ def upload_csv():
             # Clean up temporary file
             if file_path and os.path.exists(file_path):
                 os.remove(file_path)
-                print(f"🧹 Cleaned up temporary file: {file_path}")
+                logger.info("🧹 Cleaned up temporary file: %s", file_path)
                 
     except Exception as e:
-        print(f"❌ CSV Upload error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ CSV Upload error: %s", e)
         return jsonify({'error': f'An unexpected error occurred: {str(e)}'}), 500
 
+def send_download(directory, filename, download_name=None):
+    """Send a session file as an attachment with conditional (ETag/Range) support.
+
+    Range requests let clients resume interrupted downloads, and max_age=0
+    makes them revalidate instead of reusing a stale copy. Werkzeug hands the
+    open file to the server's wsgi.file_wrapper, so gunicorn can sendfile()
+    it; with USE_X_SENDFILE the front proxy serves it instead.
+    """
+    return send_from_directory(directory, filename, as_attachment=True,
+                               download_name=download_name, conditional=True,
+                               etag=True, max_age=0)
+
 @app.route('/download')
 def download_file():
     try:
         # Get existing processor with session directory
         processor = get_or_create_session()
-        csv_path = os.path.join(processor.session_dir, OUTPUT_CSV_NAME)
-        return send_file(csv_path, as_attachment=True)
+        return send_download(processor.session_dir, OUTPUT_CSV_NAME)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -941,12 +1590,10 @@ def download_bol_file():
     try:
         # Get existing processor with session directory
         processor = get_or_create_session()
-        csv_path = os.path.join(processor.session_dir, OUTPUT_CSV_NAME)
-        
-        if not os.path.exists(csv_path):
-            return jsonify({'error': 'No processed file available'}), 404
-            
-        return send_file(csv_path, as_attachment=True, download_name='BOL_processed.csv')
+        # send_download stats the file anyway; a missing one raises NotFound
+        return send_download(processor.session_dir, OUTPUT_CSV_NAME, download_name='BOL_processed.csv')
+    except NotFound:
+        return jsonify({'error': 'No processed file available'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -959,16 +1606,10 @@ def download_bol_file_by_name(filename):
         
         # Secure the filename to prevent directory traversal
         secure_name = secure_filename(filename)
-        file_path = os.path.join(processor.session_dir, secure_name)
-        
-        # Check if it's the main CSV file
-        if secure_name == OUTPUT_CSV_NAME:
-            file_path = os.path.join(processor.session_dir, OUTPUT_CSV_NAME)
-        
-        if not os.path.exists(file_path):
+        try:
+            return send_download(processor.session_dir, secure_name, download_name=secure_name)
+        except NotFound:
             return jsonify({'error': f'File {secure_name} not found'}), 404
-            
-        return send_file(file_path, as_attachment=True, download_name=secure_name)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -976,15 +1617,17 @@ def download_bol_file_by_name(filename):
 def get_status():
     """Get the current processing status."""
     try:
-        # Get existing processor with session directory
-        processor = get_or_create_session()
-        csv_path = os.path.join(processor.session_dir, OUTPUT_CSV_NAME)
+        # Look up the session without creating or cleaning it
+        session_id = peek_session_id()
+        session_dir = session_dir_for(session_id) if session_id else None
+        session_exists = bool(session_dir) and os.path.isdir(session_dir)
         
         status = {
-            'session_id': processor.session_id,
-            'has_processed_data': os.path.exists(csv_path),
-            'session_dir': processor.session_dir,
-            'session_exists': os.path.exists(processor.session_dir),
+            'session_id': session_id,
+            'job': pipeline_job_status(session_id),
+            'has_processed_data': session_exists and os.path.exists(os.path.join(session_dir, OUTPUT_CSV_NAME)),
+            'session_dir': session_dir,
+            'session_exists': session_exists,
             'query_params': {
                 '_sid': request.args.get('_sid'),
                 '_action': request.args.get('_action'),
@@ -993,25 +1636,25 @@ def get_status():
         }
         
         # Check for available files
-        if os.path.exists(processor.session_dir):
+        if session_exists:
             files = []
-            for file in os.listdir(processor.session_dir):
-                if file.endswith(('.csv', '.pdf')):
-                    file_path = os.path.join(processor.session_dir, file)
-                    files.append({
-                        'name': file,
-                        'size': os.path.getsize(file_path),
-                        'type': 'csv' if file.endswith('.csv') else 'pdf'
-                    })
+            with os.scandir(session_dir) as entries:
+                for entry in entries:
+                    ext = file_extension(entry.name)
+                    if ext in ('csv', 'pdf') and entry.is_file(follow_symlinks=False):
+                        files.append({
+                            'name': entry.name,
+                            'size': entry.stat().st_size,
+                            'type': ext
+                        })
             status['available_files'] = files
         else:
             status['available_files'] = []
         
         # Add session age information
         try:
-            session_creation_time = os.path.getctime(processor.session_dir) if os.path.exists(processor.session_dir) else None
+            session_creation_time = os.path.getctime(session_dir) if session_exists else None
             if session_creation_time:
-                import time
                 status['session_age_seconds'] = time.time() - session_creation_time
         except:
             status['session_age_seconds'] = None
@@ -1024,18 +1667,22 @@ def get_status():
 def list_files():
     """List all available files in the current session."""
     try:
-        # Get existing processor with session directory
-        processor = get_or_create_session()
+        # Look up the session without creating or cleaning it
+        session_id = peek_session_id()
+        session_dir = session_dir_for(session_id) if session_id else None
         
         files = []
-        if os.path.exists(processor.session_dir):
-            for file in os.listdir(processor.session_dir):
-                if not file.startswith('.'):  # Skip hidden files
-                    file_path = os.path.join(processor.session_dir, file)
+        if session_dir and os.path.isdir(session_dir):
+            with os.scandir(session_dir) as entries:
+                for entry in entries:
+                    file = entry.name
+                    if file.startswith('.') or not entry.is_file(follow_symlinks=False):  # Skip hidden files
+                        continue
+                    ext = file_extension(file)
                     files.append({
                         'name': file,
-                        'size': os.path.getsize(file_path),
-                        'type': 'csv' if file.endswith('.csv') else 'pdf' if file.endswith('.pdf') else 'other',
+                        'size': entry.stat().st_size,
+                        'type': ext if ext in ('csv', 'pdf') else 'other',
                         'download_url': f'/download-bol/{file}'
                     })
         
@@ -1050,19 +1697,20 @@ def process_workflow():
         # Get existing processor with session directory
         processor = get_or_create_session()
         
-        # Check if there are any PDF files to process
-        pdf_files = []
-        if os.path.exists(processor.session_dir):
-            for file in os.listdir(processor.session_dir):
-                if file.lower().endswith('.pdf'):
-                    pdf_files.append(file)
+        # Check if there are any PDF files to process (the processor just
+        # ensured the session directory exists)
+        with os.scandir(processor.session_dir) as entries:
+            pdf_files = [e.name for e in entries if file_extension(e.name) == 'pdf']
         
         if not pdf_files:
             return jsonify({'error': 'No PDF files found to process'}), 400
         
-        # Process all PDFs
-        pdf_processor = PDFProcessor(session_dir=processor.session_dir)
-        if not pdf_processor.process_first_pdf():
+        if wants_async():
+            return start_pipeline_job(processor, all_pdfs=True)
+        
+        # Process all PDFs (in parallel processes when there are several)
+        pdf_processor = make_pdf_processor(processor.session_dir)
+        if not pdf_processor.process_all_pdfs():
             return jsonify({'error': 'Failed to process PDF files'}), 500
         
         # Process text files
@@ -1084,13 +1732,11 @@ def process_workflow():
             'session_id': processor.session_id
         }
         
-        if os.path.exists(csv_path):
-            result['file_size'] = os.path.getsize(csv_path)
-            # Count rows (excluding header)
-            with open(csv_path, 'r', encoding='utf-8') as f:
-                reader = csv.reader(f)
-                row_count = sum(1 for row in reader) - 1  # Subtract header
-                result['row_count'] = row_count
+        try:
+            result['file_size'] = os.stat(csv_path).st_size
+            result['row_count'] = count_csv_rows(csv_path)
+        except FileNotFoundError:
+            pass
         
         return jsonify(result)
         
@@ -1107,13 +1753,14 @@ def clear_session():
         if external_session_id:
             # Clear specific external session
             session_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'processing_sessions', external_session_id)
+            cancel_pipeline_job(external_session_id)
             
             if os.path.exists(session_dir):
                 try:
-                    shutil.rmtree(session_dir)
-                    print(f"🗑️ Cleared external session directory: {external_session_id}")
+                    remove_session_dir(session_dir)
+                    logger.info("🗑️ Cleared external session directory: %s", external_session_id)
                 except Exception as e:
-                    print(f"⚠️ Error clearing external session {external_session_id}: {str(e)}")
+                    logger.warning("⚠️ Error clearing external session %s: %s", external_session_id, e)
                     
             return jsonify({
                 'message': f'External session {external_session_id} cleared',
@@ -1125,17 +1772,18 @@ def clear_session():
             if 'session_id' in session:
                 old_session_id = session['session_id']
                 session_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'processing_sessions', old_session_id)
+                cancel_pipeline_job(old_session_id)
                 
                 if os.path.exists(session_dir):
                     try:
-                        shutil.rmtree(session_dir)
-                        print(f"🗑️ Cleared internal session directory: {old_session_id}")
+                        remove_session_dir(session_dir)
+                        logger.info("🗑️ Cleared internal session directory: %s", old_session_id)
                     except Exception as e:
-                        print(f"⚠️ Error clearing internal session {old_session_id}: {str(e)}")
+                        logger.warning("⚠️ Error clearing internal session %s: %s", old_session_id, e)
                 
                 # Clear Flask session
                 session.clear()
-                print(f"🗑️ Cleared Flask session: {old_session_id}")
+                logger.info("🗑️ Cleared Flask session: %s", old_session_id)
                 
                 return jsonify({
                     'message': f'Internal session {old_session_id} cleared',
@@ -1158,7 +1806,7 @@ def clear_session():
 def auto_reset():
     """Endpoint specifically for automatic reset after download completion."""
     try:
-        print("🔄 Auto-reset triggered after download completion")
+        logger.info("🔄 Auto-reset triggered after download completion")
         
         # Get current session info
         processor = get_or_create_session()
@@ -1170,12 +1818,13 @@ def auto_reset():
             
         # Clean up session directory
         session_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'processing_sessions', current_session)
+        cancel_pipeline_job(current_session)
         if os.path.exists(session_dir):
-            import shutil
-            shutil.rmtree(session_dir)
-            print(f"🧹 Auto-cleanup completed for session: {current_session}")
+            remove_session_dir(session_dir)
+            logger.info("🧹 Auto-cleanup completed for session: %s", current_session)
         
         # Create fresh session
+        g.pop('_processor', None)
         new_processor = get_or_create_session()
         
         return jsonify({
@@ -1187,7 +1836,7 @@ def auto_reset():
         })
         
     except Exception as e:
-        print(f"❌ Auto-reset failed: {str(e)}")
+        logger.error("❌ Auto-reset failed: %s", e)
         return jsonify({
             'status': 'error',
             'error': str(e),
@@ -1204,6 +1853,7 @@ def new_session():
         if requested_session_id:
             # Create new session with the specific ID requested
             session_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'processing_sessions', requested_session_id)
+            cancel_pipeline_job(requested_session_id)
             
             # **SESSION CONTAMINATION FIX**: Always clean existing session directory first
             cleanup_performed = False
@@ -1211,17 +1861,17 @@ def new_session():
                 try:
                     old_files = [f for f in os.listdir(session_dir) if not f.startswith('.')]
                     if old_files:
-                        print(f"🧹 Cleaning existing session {requested_session_id} with files: {old_files}")
+                        logger.info("🧹 Cleaning existing session %s with files: %s", requested_session_id, old_files)
                         cleanup_performed = True
                     
-                    shutil.rmtree(session_dir)
-                    print(f"🗑️ Cleaned existing session directory: {requested_session_id}")
+                    remove_session_dir(session_dir)
+                    logger.info("🗑️ Cleaned existing session directory: %s", requested_session_id)
                 except Exception as e:
-                    print(f"⚠️ Warning: Could not clean existing directory: {str(e)}")
+                    logger.warning("⚠️ Warning: Could not clean existing directory: %s", e)
             
             # Create processor with clean session directory
             processor = DataProcessor(session_id=requested_session_id)
-            print(f"🆕 Created fresh external session: {requested_session_id}")
+            logger.info("🆕 Created fresh external session: %s", requested_session_id)
             
             return jsonify({
                 'status': 'created',
@@ -1241,7 +1891,7 @@ def new_session():
             processor = DataProcessor()
             session['session_id'] = processor.session_id
             
-            print(f"🆕 Created fresh internal session: {processor.session_id}")
+            logger.info("🆕 Created fresh internal session: %s", processor.session_id)
             
             return jsonify({
                 'status': 'created',
@@ -1257,9 +1907,78 @@ def new_session():
             'status': 'error'
         }), 500
 
+def list_session_directories(sessions_base_dir):
+    """Describe every session directory and its files for /debug-sessions.
+
+    The walk is cached for SESSIONS_CACHE_TTL seconds while the base
+    directory's mtime is unchanged, so rapid polls share one scan.
+    """
+    try:
+        mtime = os.stat(sessions_base_dir).st_mtime_ns
+    except FileNotFoundError:
+        return []
+    now = time.time()
+    cached = _sessions_cache.get(sessions_base_dir)
+    if cached and cached[1] == mtime and now - cached[0] < SESSIONS_CACHE_TTL:
+        return cached[2]
+    
+    session_directories = []
+    with os.scandir(sessions_base_dir) as session_entries:
+        session_dirs = [e for e in session_entries if e.is_dir() and not e.name.startswith('.')]
+    for session_entry in session_dirs:
+        item = session_entry.name
+        session_path = session_entry.path
+        # Get session directory info
+        session_info = {
+            'session_id': item,
+            'path': session_path,
+            'files': [],
+            'has_pdf': False,
+            'has_csv': False,
+            'has_combined_csv': False,
+            'size_mb': 0
+        }
+        
+        try:
+            # List files in session directory (DirEntry caches the stat result)
+            with os.scandir(session_path) as entries:
+                for entry in entries:
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    file = entry.name
+                    file_size = entry.stat().st_size
+                    session_info['files'].append({
+                        'name': file,
+                        'size_bytes': file_size,
+                        'size_mb': round(file_size / 1024 / 1024, 2)
+                    })
+                    session_info['size_mb'] += file_size / 1024 / 1024
+                    
+                    # Check file types
+                    ext = file_extension(file)
+                    if ext in ALLOWED_PDF_EXTENSIONS:
+                        session_info['has_pdf'] = True
+                    elif ext in ALLOWED_CSV_EXTENSIONS:
+                        if file == OUTPUT_CSV_NAME:
+                            session_info['has_combined_csv'] = True
+                        else:
+                            session_info['has_csv'] = True
+            
+            session_info['size_mb'] = round(session_info['size_mb'], 2)
+            session_directories.append(session_info)
+            
+        except Exception as e:
+            session_info['error'] = str(e)
+            session_directories.append(session_info)
+    
+    _sessions_cache[sessions_base_dir] = (now, mtime, session_directories)
+    return session_directories
+
 @app.route('/debug-sessions')
 def debug_sessions():
     """Debug endpoint to show all session information."""
+    if not DEBUG_SESSIONS_ENDPOINT:
+        raise NotFound()
     try:
         # Get current session info
         current_session_info = {}
@@ -1278,51 +1997,7 @@ def debug_sessions():
         
         # List all session directories
         sessions_base_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'processing_sessions')
-        session_directories = []
-        
-        if os.path.exists(sessions_base_dir):
-            for item in os.listdir(sessions_base_dir):
-                session_path = os.path.join(sessions_base_dir, item)
-                if os.path.isdir(session_path):
-                    # Get session directory info
-                    session_info = {
-                        'session_id': item,
-                        'path': session_path,
-                        'files': [],
-                        'has_pdf': False,
-                        'has_csv': False,
-                        'has_combined_csv': False,
-                        'size_mb': 0
-                    }
-                    
-                    try:
-                        # List files in session directory
-                        for file in os.listdir(session_path):
-                            file_path = os.path.join(session_path, file)
-                            if os.path.isfile(file_path):
-                                file_size = os.path.getsize(file_path)
-                                session_info['files'].append({
-                                    'name': file,
-                                    'size_bytes': file_size,
-                                    'size_mb': round(file_size / 1024 / 1024, 2)
-                                })
-                                session_info['size_mb'] += file_size / 1024 / 1024
-                                
-                                # Check file types
-                                if file.lower().endswith('.pdf'):
-                                    session_info['has_pdf'] = True
-                                elif file.lower().endswith(('.csv', '.xlsx', '.xls')):
-                                    if file == OUTPUT_CSV_NAME:
-                                        session_info['has_combined_csv'] = True
-                                    else:
-                                        session_info['has_csv'] = True
-                        
-                        session_info['size_mb'] = round(session_info['size_mb'], 2)
-                        session_directories.append(session_info)
-                        
-                    except Exception as e:
-                        session_info['error'] = str(e)
-                        session_directories.append(session_info)
+        session_directories = list_session_directories(sessions_base_dir)
         
         # Session workflow status
         workflow_status = {
@@ -1354,7 +2029,8 @@ def debug_sessions():
                 workflow_status['ready_for_csv'] = True
                 workflow_status['ready_for_download'] = os.path.exists(combined_csv)
         
-        return jsonify({
+        get_header = request.headers.get
+        response = jsonify({
             'current_session': current_session_info,
             'workflow_status': workflow_status,
             'all_sessions': session_directories,
@@ -1363,11 +2039,13 @@ def debug_sessions():
             'request_info': {
                 'method': request.method,
                 'url': request.url,
-                'user_agent': request.headers.get('User-Agent', 'Unknown'),
-                'referer': request.headers.get('Referer', 'Direct'),
+                'user_agent': get_header('User-Agent', 'Unknown'),
+                'referer': get_header('Referer', 'Direct'),
             },
             'debug_timestamp': time.time()
         })
+        response.headers['Cache-Control'] = f'private, max-age={SESSIONS_CACHE_TTL}'
+        return response
         
     except Exception as e:
         return jsonify({
@@ -1375,49 +2053,62 @@ def debug_sessions():
             'message': 'Debug session failed'
         }), 500
 
+# Headers echoed by /debug-request: what external apps typically get wrong,
+# without copying every header (or credentials) into the response
+DEBUG_REQUEST_HEADERS = (
+    'Host', 'User-Agent', 'Origin', 'Referer', 'Accept', 'Content-Type',
+    'Content-Length', 'X-Requested-With', 'X-Session-ID', 'X-Forwarded-For',
+)
+
 @app.route('/debug-request', methods=['GET', 'POST', 'PUT', 'DELETE'])
 def debug_request():
     """Debug endpoint to show what the external app is sending."""
     try:
+        headers = request.headers
         debug_info = {
             'method': request.method,
             'url': request.url,
             'path': request.path,
             'query_params': dict(request.args),
-            'headers': dict(request.headers),
+            'headers': {name: headers[name] for name in DEBUG_REQUEST_HEADERS if name in headers},
             'content_type': request.content_type,
             'content_length': request.content_length,
             'is_json': request.is_json,
             'timestamp': time.time()
         }
         
-        # Try to get request data in different formats
+        # Try to get request data in different formats; only body-parsing
+        # errors are reported inline, anything else falls through to the 500
         try:
             if request.is_json:
                 debug_info['json_data'] = request.get_json()
             else:
                 debug_info['json_data'] = None
-        except:
+        except BadRequest:
             debug_info['json_data'] = 'Error parsing JSON'
         
         try:
             debug_info['form_data'] = dict(request.form)
-        except:
-            debug_info['form_data'] = 'Error parsing form data'
-        
-        try:
             debug_info['files'] = list(request.files.keys())
-        except:
+        except (HTTPException, ValueError):
+            debug_info['form_data'] = 'Error parsing form data'
             debug_info['files'] = 'Error parsing files'
         
         try:
-            raw_data = request.get_data(as_text=True)
-            debug_info['raw_data'] = raw_data[:500] + '...' if len(raw_data) > 500 else raw_data
-            debug_info['raw_data_length'] = len(raw_data)
-        except:
+            # Only the 500-char preview is needed: a JSON body is already cached by
+            # get_json(), anything else is read from the stream up to the cap
+            if request.is_json:
+                raw_head = request.get_data()[:501]
+            else:
+                raw_head = request.stream.read(501)
+            raw_data = raw_head[:500].decode('utf-8', 'replace')
+            debug_info['raw_data'] = raw_data + '...' if len(raw_head) > 500 else raw_data
+            debug_info['raw_data_length'] = request.content_length or len(raw_head)
+        except (HTTPException, ValueError):
             debug_info['raw_data'] = 'Error getting raw data'
         
-        print(f"🔍 Debug Request: {debug_info}")
+        # The same info is in the response; only render it for the log at DEBUG
+        logger.debug("🔍 Debug Request: %r", debug_info)
         
         return jsonify({
             'status': 'debug_complete',
@@ -1431,37 +2122,40 @@ def debug_request():
             'message': 'Debug request failed'
         }), 500
 
+# /ping body, serialized once; each call only wraps these bytes in a fresh Response
+PING_BODY = (app.json.dumps({'status': 'alive', 'message': 'BOL Extractor service is running'}) + '\n').encode('utf-8')
+
 @app.route('/ping')
 def ping():
     """Simple ping endpoint to check if the service is alive."""
-    return jsonify({'status': 'alive', 'message': 'BOL Extractor service is running'})
+    return app.response_class(PING_BODY, mimetype=app.json.mimetype)
+
+# Static part of the /wake-up reply; the None slots are filled per call and keep their key position
+WAKE_UP_RESPONSE = {
+    'status': 'awake',
+    'message': 'BOL Extractor service is fully awake and ready',
+    'wake_time': None,
+    'session_test': 'passed',
+    'session_id': None,
+    'endpoints_ready': True,
+    'instructions': {
+        'upload_pdf': 'POST /upload with multipart form data',
+        'upload_csv': 'POST /upload-csv with multipart form data',
+        'download': 'GET /download-bol',
+        'session_management': 'Use ?_sid=your_session_id for external apps'
+    }
+}
 
 @app.route('/wake-up')
 def wake_up():
     """Wake up endpoint specifically for handling service sleep state."""
     try:
-        import time
         wake_time = time.time()
         
         # Test basic functionality
         test_processor = get_or_create_session()
         
-        response_data = {
-            'status': 'awake',
-            'message': 'BOL Extractor service is fully awake and ready',
-            'wake_time': wake_time,
-            'session_test': 'passed',
-            'session_id': test_processor.session_id,
-            'endpoints_ready': True,
-            'instructions': {
-                'upload_pdf': 'POST /upload with multipart form data',
-                'upload_csv': 'POST /upload-csv with multipart form data', 
-                'download': 'GET /download-bol',
-                'session_management': 'Use ?_sid=your_session_id for external apps'
-            }
-        }
-        
-        return jsonify(response_data), 200
+        return jsonify({**WAKE_UP_RESPONSE, 'wake_time': wake_time, 'session_id': test_processor.session_id}), 200
         
     except Exception as e:
         return jsonify({
@@ -1471,142 +2165,195 @@ def wake_up():
             'retry_after': 30
         }), 503
 
+# Static part of the /api/health reply; session_id is filled per call and keeps its key position
+API_HEALTH_RESPONSE = {
+    'status': 'healthy',
+    'service': 'BOL Extractor API',
+    'session_id': None,
+    'endpoints': {
+        'upload': '/upload',
+        'upload_csv': '/upload-csv',
+        'upload_base64': '/upload-base64',
+        'upload_attachment': '/upload-attachment',
+        'download': '/download',
+        'download_bol': '/download-bol',
+        'status': '/status',
+        'files': '/files',
+        'process_workflow': '/process-workflow',
+        'clear_session': '/clear-session',
+        'new_session': '/new-session',
+        'validate_session': '/validate-session',
+        'ping': '/ping',
+        'ready': '/ready',
+        'api_docs': '/api/docs',
+        # /debug-sessions is only served with DEBUG_SESSIONS=1
+        **({'debug': '/debug-sessions'} if DEBUG_SESSIONS_ENDPOINT else {}),
+        'debug_request': '/debug-request'
+    }
+}
+
 @app.route('/api/health')
 def api_health():
     """API health check endpoint."""
     try:
-        # Get existing processor to test session creation
-        processor = get_or_create_session()
-        
-        return jsonify({
-            'status': 'healthy',
-            'service': 'BOL Extractor API',
-            'session_id': processor.session_id,
-            'endpoints': {
-                'upload': '/upload',
-                'upload_csv': '/upload-csv',
-                'upload_base64': '/upload-base64',
-                'upload_attachment': '/upload-attachment',
-                'download': '/download',
-                'download_bol': '/download-bol',
-                'status': '/status',
-                'files': '/files',
-                'process_workflow': '/process-workflow',
-                'clear_session': '/clear-session',
-                'new_session': '/new-session',
-                'validate_session': '/validate-session',
-                'ping': '/ping',
-                'api_docs': '/api/docs',
-                'debug': '/debug-sessions',
-                'debug_request': '/debug-request'
-            }
-        })
+        # Liveness only: report the caller's session without creating one
+        # (probes without a cookie used to leave a new session directory each time)
+        return jsonify({**API_HEALTH_RESPONSE, 'session_id': peek_session_id()})
     except Exception as e:
         return jsonify({
             'status': 'unhealthy',
             'error': str(e)
         }), 500
 
-@app.route('/api/docs')
-def api_docs():
-    """API documentation endpoint."""
-    return jsonify({
-        'service': 'BOL Extractor API',
-        'version': '1.0.0',
-        'description': 'API for processing BOL (Bill of Lading) PDF files and CSV data',
-        'endpoints': {
-            'GET /': {
-                'description': 'Main application page',
-                'response': 'HTML page'
-            },
-            'POST /upload': {
-                'description': 'Upload and process a PDF file',
-                'parameters': {
-                    'file': 'PDF file (multipart/form-data)'
-                },
-                'response': 'Processing result'
-            },
-            'POST /upload-csv': {
-                'description': 'Upload and merge CSV/Excel data',
-                'parameters': {
-                    'file': 'CSV/Excel file (multipart/form-data)'
-                },
-                'response': 'Merge result'
-            },
-            'POST /upload-base64': {
-                'description': 'Upload and process base64 encoded PDF file',
-                'parameters': {
-                    'file_data': 'Base64 encoded file data (JSON)',
-                    'filename': 'Optional filename (JSON)'
-                },
-                'response': 'Processing result'
-            },
-            'POST /upload-attachment': {
-                'description': 'Upload and process attachment data (flexible format)',
-                'parameters': {
-                    'attachmentData': 'Attachment data (base64 or bytes)',
-                    'filename': 'Optional filename'
-                },
-                'response': 'Processing result'
-            },
-            'GET /download': {
-                'description': 'Download processed CSV file',
-                'response': 'CSV file download'
-            },
-            'GET /download-bol': {
-                'description': 'Download processed BOL CSV file',
-                'response': 'CSV file download'
-            },
-            'GET /download-bol/<filename>': {
-                'description': 'Download specific file by name',
-                'parameters': {
-                    'filename': 'Name of file to download'
-                },
-                'response': 'File download'
-            },
-            'GET /status': {
-                'description': 'Get current processing status',
-                'response': 'Status information'
-            },
-            'GET /files': {
-                'description': 'List available files in current session',
-                'response': 'List of available files'
+@app.route('/ready')
+def ready():
+    """Readiness probe: the sessions directory exists and is writable."""
+    sessions_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'processing_sessions')
+    try:
+        os.makedirs(sessions_dir, exist_ok=True)
+    except OSError as e:
+        return jsonify({'status': 'not_ready', 'error': str(e)}), 503
+    if not os.access(sessions_dir, os.W_OK):
+        return jsonify({'status': 'not_ready', 'error': 'Sessions directory is not writable'}), 503
+    return jsonify({'status': 'ready'})
+
+# /api/docs content; static per deploy, so it is serialized once at import
+API_DOCS = {
+    'service': 'BOL Extractor API',
+    'version': '1.0.0',
+    'description': 'API for processing BOL (Bill of Lading) PDF files and CSV data',
+    'endpoints': {
+        'GET /': {
+            'description': 'Main application page',
+            'response': 'HTML page'
+        },
+        'POST /upload': {
+            'description': 'Upload and process a PDF file',
+            'parameters': {
+                'file': 'PDF file (multipart/form-data)'
             },
-            'POST /process-workflow': {
-                'description': 'Process complete workflow',
-                'response': 'Workflow processing result'
+            'response': 'Processing result'
+        },
+        'POST /upload-csv': {
+            'description': 'Upload and merge CSV/Excel data',
+            'parameters': {
+                'file': 'CSV/Excel file (multipart/form-data)'
             },
-            'POST /clear-session': {
-                'description': 'Clear current session and start fresh',
-                'response': 'Session clearing result'
+            'response': 'Merge result'
+        },
+        'POST /upload-base64': {
+            'description': 'Upload and process base64 encoded PDF file',
+            'parameters': {
+                'file_data': 'Base64 encoded file data (JSON)',
+                'filename': 'Optional filename (JSON)'
             },
-            'GET /validate-session': {
-                'description': 'Validate session state and detect contamination',
-                'parameters': {
-                    '_sid': 'Session ID to validate'
-                },
-                'response': 'Session validation results and recommendations'
+            'response': 'Processing result'
+        },
+        'POST /upload-attachment': {
+            'description': 'Upload and process attachment data (flexible format)',
+            'parameters': {
+                'file': 'Raw PDF file (multipart/form-data, skips base64)',
+                'attachmentData': 'Attachment data (base64 or bytes)',
+                'filename': 'Optional filename',
+                '_async': 'Optional query flag (1) to process in the background; returns 202, poll /status'
             },
-            'GET /ping': {
-                'description': 'Simple ping to check service availability',
-                'response': 'Service status'
+            'response': 'Processing result'
+        },
+        'GET /download': {
+            'description': 'Download processed CSV file',
+            'response': 'CSV file download'
+        },
+        'GET /download-bol': {
+            'description': 'Download processed BOL CSV file',
+            'response': 'CSV file download'
+        },
+        'GET /download-bol/<filename>': {
+            'description': 'Download specific file by name',
+            'parameters': {
+                'filename': 'Name of file to download'
             },
-            'GET /health': {
-                'description': 'Health check endpoint',
-                'response': 'Health status'
+            'response': 'File download'
+        },
+        'GET /status': {
+            'description': 'Get current processing status',
+            'response': 'Status information'
+        },
+        'GET /files': {
+            'description': 'List available files in current session',
+            'response': 'List of available files'
+        },
+        'POST /process-workflow': {
+            'description': 'Process complete workflow',
+            'response': 'Workflow processing result'
+        },
+        'POST /clear-session': {
+            'description': 'Clear current session and start fresh',
+            'response': 'Session clearing result'
+        },
+        'GET /validate-session': {
+            'description': 'Validate session state and detect contamination',
+            'parameters': {
+                '_sid': 'Session ID to validate'
             },
-            'GET /api/health': {
-                'description': 'API health check endpoint',
-                'response': 'API health status'
-            }
+            'response': 'Session validation results and recommendations'
         },
-        'cors': {
-            'enabled': True,
-            'allow_origin': '*',
-            'allow_methods': ['GET', 'POST', 'OPTIONS', 'PUT', 'DELETE'],
-            'allow_headers': ['Content-Type', 'Authorization', 'X-Requested-With']
+        'GET /ping': {
+            'description': 'Simple ping to check service availability',
+            'response': 'Service status'
+        },
+        'GET /health': {
+            'description': 'Health check endpoint',
+            'response': 'Health status'
+        },
+        'GET /api/health': {
+            'description': 'API health check endpoint',
+            'response': 'API health status'
+        },
+        'GET /ready': {
+            'description': 'Readiness check (sessions directory writable); no session is created',
+            'response': 'Readiness status (503 when not ready)'
         }
-    })
+    },
+    'cors': {
+        'enabled': True,
+        'allow_origin': '*',
+        'allow_methods': ['GET', 'POST', 'OPTIONS', 'PUT', 'DELETE'],
+        'allow_headers': ['Content-Type', 'Authorization', 'X-Requested-With']
+    }
+}
+API_DOCS_BODY = (app.json.dumps(API_DOCS) + '\n').encode('utf-8')
+API_DOCS_ETAG = hashlib.md5(API_DOCS_BODY).hexdigest()
+
+@app.route('/api/docs')
+def api_docs():
+    """API documentation endpoint."""
+    response = app.response_class(API_DOCS_BODY, mimetype=app.json.mimetype)
+    response.set_etag(API_DOCS_ETAG)
+    # Let browsers/proxies reuse it for a day; after that the ETag makes revalidation a 304
+    response.headers['Cache-Control'] = 'public, max-age=86400'
+    return response.make_conditional(request)
+
+# validate-session advice per outcome (contamination risk, or empty/missing directory)
+_CLEANUP_RECS = (
+    'Call /clear-session before processing new documents',
+    'Call /new-session to ensure clean processing environment',
+)
+VALIDATION_RECOMMENDATIONS = {
+    'high': ('Multiple PDF files detected - may cause processing conflicts',) + _CLEANUP_RECS,
+    'medium': ('Processed CSV files detected - may return cached results',) + _CLEANUP_RECS,
+    'low': ('Extracted text files detected - may interfere with new processing',),
+    'minimal': ('Unknown file types detected',),
+    'empty': ('Session directory is clean and ready for processing',),
+    'missing': ('Session directory does not exist - will be created on first use',),
+}
+# Clean-run sequence suggested for a contaminated session; each step gets the session id appended
+PROPER_WORKFLOW_STEPS = (
+    'POST /clear-session?_sid=',
+    'POST /new-session?_sid=',
+    'POST /upload?_sid=',
+    'GET /download?_sid=',
+    'POST /clear-session?_sid=',
+)
 
 @app.route('/validate-session', methods=['GET'])
 def validate_session():
@@ -1625,75 +2372,70 @@ def validate_session():
         # Check session directory
         session_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'processing_sessions', external_session_id)
         
-        validation_result = {
-            'session_id': external_session_id,
-            'session_dir': session_dir,
-            'directory_exists': os.path.exists(session_dir),
-            'is_clean': True,
-            'contamination_risk': 'none',
-            'files_found': [],
-            'recommendations': [],
-            'status': 'valid'
-        }
-        
-        if os.path.exists(session_dir):
-            # List all files in session directory
-            all_files = [f for f in os.listdir(session_dir) if not f.startswith('.')]
-            validation_result['files_found'] = all_files
+        # One scandir both lists the directory and tells us whether it exists
+        try:
+            with os.scandir(session_dir) as entries:
+                all_files = [e.name for e in entries if not e.name.startswith('.')]
+            directory_exists = True
+        except FileNotFoundError:
+            all_files = []
+            directory_exists = False
+        
+        is_clean = True
+        contamination_risk = 'none'
+        status = 'valid'
+        extras = {}
+        
+        if all_files:
+            # Analyze file types and contamination risk (one extension lookup per file)
+            buckets = {'pdf': [], 'txt': [], 'csv': [], 'other': []}
+            for f in all_files:
+                buckets.get(file_extension(f), buckets['other']).append(f)
+            pdf_files = buckets['pdf']
+            txt_files = buckets['txt']
+            csv_files = buckets['csv']
             
-            if all_files:
-                # Analyze file types and contamination risk
-                pdf_files = [f for f in all_files if f.lower().endswith('.pdf')]
-                txt_files = [f for f in all_files if f.lower().endswith('.txt')]
-                csv_files = [f for f in all_files if f.lower().endswith('.csv')]
-                
-                validation_result['file_breakdown'] = {
-                    'pdf_files': pdf_files,
-                    'txt_files': txt_files,
-                    'csv_files': csv_files,
-                    'other_files': [f for f in all_files if not any(f.lower().endswith(ext) for ext in ['.pdf', '.txt', '.csv'])]
-                }
-                
-                # Determine contamination risk
-                if len(pdf_files) > 1:
-                    validation_result['contamination_risk'] = 'high'
-                    validation_result['is_clean'] = False
-                    validation_result['recommendations'].append('Multiple PDF files detected - may cause processing conflicts')
-                elif csv_files:
-                    validation_result['contamination_risk'] = 'medium'
-                    validation_result['is_clean'] = False
-                    validation_result['recommendations'].append('Processed CSV files detected - may return cached results')
-                elif txt_files:
-                    validation_result['contamination_risk'] = 'low'
-                    validation_result['is_clean'] = False
-                    validation_result['recommendations'].append('Extracted text files detected - may interfere with new processing')
-                else:
-                    validation_result['contamination_risk'] = 'minimal'
-                    validation_result['recommendations'].append('Unknown file types detected')
-                
-                # Add cleanup recommendations
-                if validation_result['contamination_risk'] in ['high', 'medium']:
-                    validation_result['recommendations'].append('Call /clear-session before processing new documents')
-                    validation_result['recommendations'].append('Call /new-session to ensure clean processing environment')
-                    validation_result['status'] = 'contaminated'
-                
-                validation_result['is_clean'] = False
+            extras['file_breakdown'] = {
+                'pdf_files': pdf_files,
+                'txt_files': txt_files,
+                'csv_files': csv_files,
+                'other_files': buckets['other']
+            }
+            
+            # Determine contamination risk; any leftover file makes the session unclean
+            is_clean = False
+            if len(pdf_files) > 1:
+                contamination_risk = 'high'
+            elif csv_files:
+                contamination_risk = 'medium'
+            elif txt_files:
+                contamination_risk = 'low'
             else:
-                validation_result['recommendations'].append('Session directory is clean and ready for processing')
+                contamination_risk = 'minimal'
+            
+            if contamination_risk in ('high', 'medium'):
+                status = 'contaminated'
+            recommendations_key = contamination_risk
         else:
-            validation_result['recommendations'].append('Session directory does not exist - will be created on first use')
+            recommendations_key = 'empty' if directory_exists else 'missing'
+        recommendations = list(VALIDATION_RECOMMENDATIONS[recommendations_key])
         
         # Add workflow recommendations
-        if validation_result['contamination_risk'] != 'none':
-            validation_result['proper_workflow'] = [
-                'POST /clear-session?_sid=' + external_session_id,
-                'POST /new-session?_sid=' + external_session_id,
-                'POST /upload?_sid=' + external_session_id,
-                'GET /download?_sid=' + external_session_id,
-                'POST /clear-session?_sid=' + external_session_id
-            ]
+        if contamination_risk != 'none':
+            extras['proper_workflow'] = [step + external_session_id for step in PROPER_WORKFLOW_STEPS]
         
-        return jsonify(validation_result)
+        # Assemble the response once, after the analysis
+        return jsonify({
+            'session_id': external_session_id,
+            'session_dir': session_dir,
+            'directory_exists': directory_exists,
+            'is_clean': is_clean,
+            'contamination_risk': contamination_risk,
+            'files_found': all_files,
+            'recommendations': recommendations,
+            'status': status,
+            **extras
+        })
         
     except Exception as e:
         return jsonify({
@@ -1702,47 +2444,58 @@ def validate_session():
             'message': 'Session validation failed'
         }), 500
 
+# CORS/embedding headers, built once; after_request sets these on every response
+_CORS_ALLOW_HEADERS = 'Content-Type,Authorization,X-Requested-With,Cache-Control,Pragma,Expires,X-API-Key,X-Custom-Header,X-Session-ID'
+RESPONSE_HEADERS = (
+    ('Access-Control-Allow-Origin', '*'),
+    ('Access-Control-Allow-Headers', _CORS_ALLOW_HEADERS),
+    ('Access-Control-Allow-Methods', 'GET, POST, OPTIONS, PUT, DELETE'),
+    ('Access-Control-Allow-Credentials', 'false'),
+    ('Access-Control-Expose-Headers', 'Content-Disposition'),
+    ('X-Frame-Options', 'ALLOWALL'),
+    ('X-Content-Type-Options', 'nosniff'),
+)
+# Preflight replies are complete as built, so after_request leaves them alone
+PREFLIGHT_HEADERS = RESPONSE_HEADERS + (('Access-Control-Max-Age', '86400'),)
+
+def preflight_response():
+    """Empty 204 CORS preflight response with the precomputed headers."""
+    return app.response_class(status=204, headers=PREFLIGHT_HEADERS)
+
 @app.before_request
 def handle_preflight():
     """Handle CORS preflight requests."""
     if request.method == "OPTIONS":
-        response = make_response()
-        response.headers["Access-Control-Allow-Origin"] = "*"
-        response.headers['Access-Control-Allow-Headers'] = "Content-Type,Authorization,X-Requested-With,Cache-Control,Pragma,Expires,X-API-Key,X-Custom-Header,X-Session-ID"
-        response.headers['Access-Control-Allow-Methods'] = "GET,PUT,POST,DELETE,OPTIONS"
-        response.headers['Access-Control-Max-Age'] = '86400'
-        return response
+        return preflight_response()
 
 @app.route('/<path:path>', methods=['OPTIONS'])
 def handle_options(path):
     """Handle OPTIONS requests for all paths."""
-    response = make_response()
-    response.headers["Access-Control-Allow-Origin"] = "*"
-    response.headers['Access-Control-Allow-Headers'] = "Content-Type,Authorization,X-Requested-With,Cache-Control,Pragma,Expires,X-API-Key,X-Custom-Header,X-Session-ID"
-    response.headers['Access-Control-Allow-Methods'] = "GET,PUT,POST,DELETE,OPTIONS"
-    response.headers['Access-Control-Max-Age'] = '86400'
-    return response
+    return preflight_response()
 
 @app.after_request
 def after_request(response):
     """Add headers to allow iframe embedding and CORS."""
-    # Remove any existing CORS headers to prevent duplicates
-    response.headers.pop('Access-Control-Allow-Origin', None)
-    response.headers.pop('Access-Control-Allow-Headers', None)
-    response.headers.pop('Access-Control-Allow-Methods', None)
-    response.headers.pop('Access-Control-Allow-Credentials', None)
-    response.headers.pop('Access-Control-Expose-Headers', None)
-    
-    # Add fresh CORS headers
-    response.headers['Access-Control-Allow-Origin'] = '*'
-    response.headers['Access-Control-Allow-Headers'] = 'Content-Type,Authorization,X-Requested-With,Cache-Control,Pragma,Expires,X-API-Key,X-Custom-Header,X-Session-ID'
-    response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS, PUT, DELETE'
-    response.headers['Access-Control-Allow-Credentials'] = 'false'
-    response.headers['Access-Control-Expose-Headers'] = 'Content-Disposition'
-    response.headers['X-Frame-Options'] = 'ALLOWALL'
-    response.headers['X-Content-Type-Options'] = 'nosniff'
+    if request.method == 'OPTIONS':
+        return response  # preflight_response() already carries every header
+    headers = response.headers
+    if 'Access-Control-Allow-Origin' in headers:
+        # Already carries CORS headers; assignment replaces them without duplicates
+        for name, value in RESPONSE_HEADERS:
+            headers[name] = value
+    else:
+        # Usual case (including file downloads): nothing to replace, just append
+        headers.extend(RESPONSE_HEADERS)
     return response
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8080))
-    app.run(host='0.0.0.0', port=port)
\ No newline at end of file
+    # Deployments run under gunicorn (see Procfile); for direct runs prefer
+    # waitress's thread pool over Werkzeug's development server
+    try:
+        from waitress import serve
+    except ImportError:
+        app.run(host='0.0.0.0', port=port, threaded=True)
+    else:
+        logger.info("🚀 Serving with waitress on port %s", port)
+        serve(app, host='0.0.0.0', port=port, threads=8)
\ No newline at end of file
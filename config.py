@@ -11,6 +11,39 @@ else:
     # On Linux, poppler-utils is installed via apt-get and is usually in PATH
     POPPLER_PATH = None  # or '/usr/bin' if your code requires an explicit path
 
+# Render threads pdftoppm may use when rasterizing PDF pages
+PDF_THREAD_COUNT = int(os.environ.get("PDF_THREAD_COUNT", max(1, (os.cpu_count() or 1) - 1)))
+
+# Worker processes used to parse extracted pages, and the page count
+# below which parsing stays in-process (pool start-up costs more)
+PAGE_WORKERS = int(os.environ.get("PAGE_WORKERS", os.cpu_count() or 1))
+PARALLEL_PAGE_THRESHOLD = 8
+
+# Logging level for request/merge logs (DEBUG adds per-request diagnostics)
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+
+# Threads that run background (?_async=1) PDF pipeline jobs
+PIPELINE_WORKERS = int(os.environ.get("PIPELINE_WORKERS", os.cpu_count() or 1))
+
+# Let a front proxy (nginx/Apache) stream downloads via X-Sendfile; only
+# enable when such a proxy is configured to serve the sessions directory
+USE_X_SENDFILE = os.environ.get("USE_X_SENDFILE", "").lower() in ("1", "true", "yes")
+
+# Serve /debug-sessions, which lists every session directory and its files;
+# off unless DEBUG_SESSIONS=1 is set, e.g. in development
+DEBUG_SESSIONS_ENDPOINT = os.environ.get("DEBUG_SESSIONS", "").lower() in ("1", "true", "yes")
+
+# Strings pandas' CSV reader treats as missing values by default
+CSV_NA_VALUES = [
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan',
+    '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None',
+    'n/a', 'nan', 'null'
+]
+
+# Largest PDF accepted by the attachment/base64 uploads (checked before decoding).
+# Kept below the 16 MiB request cap, whose base64 bodies decode to at most 12 MiB.
+MAX_PDF_BYTES = int(os.environ.get("MAX_PDF_BYTES", 10 * 1024 * 1024))
+
 # File Processing
 OUTPUT_CSV_NAME = "combined_data.csv"
 
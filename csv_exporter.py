@@ -1,8 +1,12 @@
 import os
 import gc
+import csv
 import glob
+import logging
 import pandas as pd
-from config import OUTPUT_CSV_NAME
+from config import OUTPUT_CSV_NAME, LOG_LEVEL, CSV_NA_VALUES
+
+logger = logging.getLogger(__name__)
 
 class CSVExporter:
     def __init__(self, session_dir):
@@ -17,10 +21,10 @@ class CSVExporter:
                         if os.path.basename(f) != OUTPUT_CSV_NAME]
 
             if not csv_files:
-                print("No CSV files found to combine")
+                logger.warning("No CSV files found to combine")
                 return False
 
-            print(f"Found {len(csv_files)} CSV files to combine")
+            logger.info("Found %s CSV files to combine", len(csv_files))
 
             # Process files in chunks to conserve memory
             chunk_size = 5
@@ -29,7 +33,7 @@ class CSVExporter:
 
             for i in range(0, len(csv_files), chunk_size):
                 chunk = csv_files[i:i + chunk_size]
-                print(f"Processing chunk {i//chunk_size + 1} of {(len(csv_files) + chunk_size - 1)//chunk_size}")
+                logger.info("Processing chunk %s of %s", i//chunk_size + 1, (len(csv_files) + chunk_size - 1)//chunk_size)
                 
                 # Read and combine chunk of CSV files
                 dfs = []
@@ -41,7 +45,7 @@ class CSVExporter:
                         # Delete the individual CSV file after reading
                         os.remove(file)
                     except Exception as e:
-                        print(f"Error processing {file}: {str(e)}")
+                        logger.error("Error processing %s: %s", file, e)
                         continue
 
                 if not dfs:
@@ -63,13 +67,38 @@ class CSVExporter:
                 del chunk_df
                 gc.collect()
 
-            print(f"Successfully combined files into {OUTPUT_CSV_NAME}")
+            logger.info("Successfully combined files into %s", OUTPUT_CSV_NAME)
+            return True
+
+        except Exception as e:
+            logger.error("Error combining CSV files: %s", e)
+            return False
+
+    def write_rows(self, header, rows):
+        """Write already-formatted rows straight to the combined CSV.
+
+        Values pandas reads as missing (CSV_NA_VALUES, e.g. "NA" or "N/A") are
+        written blank, as combine_to_csv's read_csv/to_csv round trip did.
+        """
+        if rows is None:
+            logger.warning("No rows to write")
+            return False
+        try:
+            output_path = os.path.join(self.session_dir, OUTPUT_CSV_NAME)
+            with open(output_path, 'w', encoding='utf-8', newline='') as file:
+                writer = csv.writer(file, lineterminator='\n')
+                writer.writerow(header)
+                na_values = frozenset(CSV_NA_VALUES)
+                writer.writerows([('' if value in na_values else value) for value in row] for row in rows)
+
+            logger.info("Successfully wrote %s rows to %s", len(rows), OUTPUT_CSV_NAME)
             return True
 
         except Exception as e:
-            print(f"Error combining CSV files: {str(e)}")
+            logger.error("Error writing combined CSV: %s", e)
             return False
 
 if __name__ == "__main__":
+    logging.basicConfig(level=LOG_LEVEL, format="%(message)s")
     exporter = CSVExporter(".")
     exporter.combine_to_csv()
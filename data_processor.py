@@ -4,10 +4,14 @@ import csv
 import io
 import uuid
 import shutil
+import logging
 from datetime import datetime
-from utils import FileUtils  # Removed OpenAI dependency
+from utils import FileUtils, ProcessPoolUtils  # Removed OpenAI dependency
+from config import PAGE_WORKERS, PARALLEL_PAGE_THRESHOLD, LOG_LEVEL
 import gc
 
+logger = logging.getLogger(__name__)
+
 class DataProcessor:
     def __init__(self, session_id=None):
         """Initialize the data processor with a session directory."""
@@ -26,25 +30,19 @@ class DataProcessor:
     def _setup_session_directory(self):
         """Create the session directory if it doesn't exist."""
         try:
-            # Ensure parent directories exist first
-            parent_dir = os.path.dirname(self.session_dir)
-            os.makedirs(parent_dir, exist_ok=True)
-            
-            # Create the session directory
+            # Create the session directory (and processing_sessions/ with it);
+            # makedirs raises if it can't, so no separate existence check is needed
             os.makedirs(self.session_dir, exist_ok=True)
             
-            # Verify the directory was created and is accessible
-            if not os.path.exists(self.session_dir):
-                raise Exception(f"Failed to create session directory: {self.session_dir}")
-            
+            # Verify the directory is accessible
             if not os.access(self.session_dir, os.W_OK):
                 raise Exception(f"Session directory not writable: {self.session_dir}")
             
-            print(f"✅ Session directory ready: {self.session_dir}")
+            logger.info("✅ Session directory ready: %s", self.session_dir)
             
         except Exception as e:
             error_msg = f"Error setting up session directory: {str(e)}"
-            print(f"❌ {error_msg}")
+            logger.error("❌ %s", error_msg)
             raise Exception(error_msg)
 
     @staticmethod
@@ -55,59 +53,62 @@ class DataProcessor:
         if os.path.exists(sessions_dir):
             try:
                 shutil.rmtree(sessions_dir)
-                print("Cleaned up all processing sessions")
+                logger.info("Cleaned up all processing sessions")
             except Exception as e:
-                print(f"Error cleaning up sessions: {str(e)}")
+                logger.error("Error cleaning up sessions: %s", e)
 
     def process_all_files(self):
         """Process all TXT files in the session directory."""
         # Get all txt files except requirements.txt
         txt_files = [f for f in FileUtils.get_txt_files(self.session_dir) if f != 'requirements.txt']
         if not txt_files:
-            print("No TXT files found in the session directory")
+            logger.warning("No TXT files found in the session directory")
             return False
 
-        print(f"Found {len(txt_files)} TXT files to process")
+        logger.info("Found %s TXT files to process", len(txt_files))
         
         try:
             # Process all files without deleting them first
-            print("=== PHASE 1: COLLECTING DATA FROM ALL FILES ===")
-            for txt_file in txt_files:
-                self._collect_invoice_data(txt_file)
+            logger.info("=== PHASE 1: COLLECTING DATA FROM ALL FILES ===")
+            if len(txt_files) >= PARALLEL_PAGE_THRESHOLD:
+                self._collect_invoice_data_parallel(txt_files)
+            else:
+                for txt_file in txt_files:
+                    self._collect_invoice_data(txt_file)
             
             # Validate collected data
-            print("=== DATA COLLECTION SUMMARY ===")
+            logger.info("=== DATA COLLECTION SUMMARY ===")
             total_collected_rows = 0
             for invoice_no, data in self.invoice_data.items():
                 invoice_rows = sum(len(page['rows']) for page in data['pages'])
                 total_collected_rows += invoice_rows
-                print(f"Invoice {invoice_no}: {len(data['pages'])} pages, {invoice_rows} rows")
-            print(f"TOTAL COLLECTED ROWS: {total_collected_rows}")
+                logger.debug("Invoice %s: %s pages, %s rows", invoice_no, len(data['pages']), invoice_rows)
+            logger.info("TOTAL COLLECTED ROWS: %s", total_collected_rows)
             
             # Process all collected data
-            print("\n=== PHASE 2: PROCESSING COLLECTED DATA ===")
+            logger.info("=== PHASE 2: PROCESSING COLLECTED DATA ===")
             total_processed_rows = 0
             for invoice_no, pages_data in self.invoice_data.items():
                 rows_processed = self._process_invoice_data(invoice_no, pages_data)
                 total_processed_rows += rows_processed
             
-            print(f"\n=== PROCESSING SUMMARY ===")
-            print(f"Total rows collected: {total_collected_rows}")
-            print(f"Total rows processed: {total_processed_rows}")
+            logger.info("=== PROCESSING SUMMARY ===")
+            logger.info("Total rows collected: %s", total_collected_rows)
+            logger.info("Total rows processed: %s", total_processed_rows)
             
             if total_collected_rows != total_processed_rows:
-                print(f"⚠️  WARNING: Row count mismatch! {total_collected_rows - total_processed_rows} rows may have been lost!")
+                logger.warning("⚠️  WARNING: Row count mismatch! %s rows may have been lost!", total_collected_rows - total_processed_rows)
             else:
-                print("✅ SUCCESS: All collected rows were processed successfully!")
+                logger.info("✅ SUCCESS: All collected rows were processed successfully!")
             
             # Clean up TXT files only after successful processing
-            print("\n=== PHASE 3: CLEANING UP TXT FILES ===")
+            logger.info("=== PHASE 3: CLEANING UP TXT FILES ===")
             self._cleanup_txt_files()
             
             return True
             
         except Exception as e:
-            print(f"Error processing files: {str(e)}")
+            logger.error("Error processing files: %s", e)
             return False
 
     def _cleanup_txt_files(self):
@@ -117,56 +118,104 @@ class DataProcessor:
             file_path = os.path.join(self.session_dir, txt_file)
             try:
                 os.remove(file_path)
-                print(f"Cleaned up {txt_file}")
+                logger.debug("Cleaned up %s", txt_file)
             except Exception as e:
-                print(f"Warning: Could not remove {txt_file}: {str(e)}")
+                logger.warning("Warning: Could not remove %s: %s", txt_file, e)
 
     def _collect_invoice_data(self, txt_file):
         """Collect data from a single TXT file and group by invoice number."""
-        file_path = os.path.join(self.session_dir, txt_file)
-        print(f"Collecting data from {txt_file}...")
+        invoice_no, page_data = self._parse_page_file(txt_file)
+        self._add_page_data(txt_file, invoice_no, page_data)
+        
+        # Force garbage collection
+        gc.collect()
+
+    def _collect_invoice_data_parallel(self, txt_files):
+        """Parse TXT files across worker processes, then group them in file order."""
+        file_paths = [os.path.join(self.session_dir, txt_file) for txt_file in txt_files]
+        results = self._map_in_pool(parse_page_file, file_paths)
+        if results is None:
+            for txt_file in txt_files:
+                self._collect_invoice_data(txt_file)
+            return
+        
+        for txt_file, (invoice_no, page_data) in zip(txt_files, results):
+            self._add_page_data(txt_file, invoice_no, page_data)
+
+    def _map_in_pool(self, parse, *iterables):
+        """Map a module-level `parse` over pages in the shared worker pool; None if no pool is available."""
+        count = len(iterables[0])
+        logger.info("Parsing %s pages across %s processes", count, min(PAGE_WORKERS, count))
+        results = ProcessPoolUtils.map(parse, *iterables)
+        if results is None:
+            logger.info("Parsing pages sequentially")
+        return results
+
+    def process_pages_in_memory(self, pages):
+        """Parse extracted page texts without TXT files and return (header, rows) for the combined CSV.
+
+        rows is None when no invoice was found; the whole result is None on error.
+        """
+        labels = [f"page {i}" for i in range(1, len(pages) + 1)]
+        logger.debug("Found %s pages to process", len(pages))
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-
-            invoice_no = self._get_invoice_no(content)
-            if not invoice_no:
-                print(f"Invoice number not found in {txt_file}")
-                return
-
-            # Initialize invoice data if not exists
-            if invoice_no not in self.invoice_data:
-                self.invoice_data[invoice_no] = {
-                    'pages': [],
-                    'has_totals': False
-                }
-
-            # Extract table rows and check for totals
-            table_data = self._extract_table_data(content)
-            if table_data:
-                rows, has_totals, totals = table_data
-                page_data = {
-                    'rows': rows,  # Don't store full content, just extracted data
-                    'has_totals': has_totals,
-                    'totals': totals,
-                    'bol_cube': self._extract_bol_cube(content)
-                }
-                self.invoice_data[invoice_no]['pages'].append(page_data)
-                if has_totals:
-                    self.invoice_data[invoice_no]['has_totals'] = True
-                
-                print(f"  Found {len(rows)} rows in {txt_file}, totals: {has_totals}")
+            results = None
+            if len(pages) >= PARALLEL_PAGE_THRESHOLD:
+                results = self._map_in_pool(parse_page_content, pages, labels)
+            if results is None:
+                results = [self._parse_page_content(page, label) for page, label in zip(pages, labels)]
+            
+            for label, (invoice_no, page_data) in zip(labels, results):
+                self._add_page_data(label, invoice_no, page_data)
             
-            # DON'T DELETE THE TXT FILE HERE - wait until all processing is complete
+            if not self.invoice_data:
+                logger.warning("No invoice data found in pages")
+                return self._csv_header(), None
+            
+            rows = []
+            for invoice_no, pages_data in self.invoice_data.items():
+                all_rows, totals = self._collect_invoice_rows(invoice_no, pages_data)
+                rows.extend(self._format_rows(all_rows, totals['pieces'], totals['weight']))
+            
+            logger.info("Total rows processed: %s", len(rows))
+            return self._csv_header(), rows
             
         except Exception as e:
-            print(f"Error collecting data from {txt_file}: {str(e)}")
+            logger.error("Error processing pages: %s", e)
+            return None
+
+    def _parse_page_file(self, txt_file):
+        """Parse a single TXT file into (invoice_no, page_data) without touching shared state."""
+        return parse_page_file(os.path.join(self.session_dir, txt_file))
+
+    def _parse_page_content(self, content, label):
+        """Parse one page's text into (invoice_no, page_data) without touching shared state."""
+        return parse_page_content(content, label)
+
+    def _add_page_data(self, txt_file, invoice_no, page_data):
+        """Add a parsed page to the data collected for its invoice."""
+        if not invoice_no:
+            return
+
+        # Initialize invoice data if not exists
+        if invoice_no not in self.invoice_data:
+            self.invoice_data[invoice_no] = {
+                'pages': [],
+                'has_totals': False
+            }
+
+        if page_data:
+            self.invoice_data[invoice_no]['pages'].append(page_data)
+            if page_data['has_totals']:
+                self.invoice_data[invoice_no]['has_totals'] = True
+            
+            logger.debug("  Found %s rows in %s, totals: %s", len(page_data['rows']), txt_file, page_data['has_totals'])
         
-        # Force garbage collection
-        gc.collect()
+        # DON'T DELETE THE TXT FILE HERE - wait until all processing is complete
 
-    def _extract_table_data(self, content):
+    @staticmethod
+    def _extract_table_data(content):
         """Extract table rows and totals from content."""
         lines = content.splitlines()
         table_start = None
@@ -178,15 +227,15 @@ class DataProcessor:
         for i, line in enumerate(lines):
             if "CARTONS" in line.upper() and "STYLE" in line.upper() and "PIECES" in line.upper():
                 table_start = i
-                print(f"  Found table header at line {i}: {line.strip()}")
+                logger.debug("  Found table header at line %s: %s", i, line.strip())
                 break
 
         if table_start is None:
-            print("  WARNING: Table header not found")
+            logger.warning("  WARNING: Table header not found")
             return None
 
         # Process rows and look for totals
-        print(f"  Processing table data from line {table_start + 1}...")
+        logger.debug("  Processing table data from line %s...", table_start + 1)
         for line_num, line in enumerate(lines[table_start+1:], table_start + 2):
             line_stripped = line.strip()
             
@@ -197,12 +246,12 @@ class DataProcessor:
                 if len(tokens) >= 11:
                     totals['pieces'] = tokens[3].replace(',', '')
                     totals['weight'] = tokens[-1].replace(',', '')
-                print(f"  Found totals at line {line_num}: pieces={totals['pieces']}, weight={totals['weight']}")
+                logger.debug("  Found totals at line %s: pieces=%s, weight=%s", line_num, totals['pieces'], totals['weight'])
                 break
             
             # Stop at shipping instructions
             if "SHIPPING INSTRUCTIONS:" in line.upper():
-                print(f"  Reached shipping instructions at line {line_num}")
+                logger.debug("  Reached shipping instructions at line %s", line_num)
                 break
             
             # Skip empty lines
@@ -211,7 +260,7 @@ class DataProcessor:
             
             # Improved row detection - more flexible patterns
             # Look for lines that contain numeric data that could be table rows
-            if self._is_valid_table_row(line_stripped):
+            if DataProcessor._is_valid_table_row(line_stripped):
                 tokens = line_stripped.split()
                 if len(tokens) >= 3:
                     try:
@@ -229,20 +278,21 @@ class DataProcessor:
                         
                         if individual_weight:  # Only add if we found a weight
                             rows.append([cartons, individual_pieces, individual_weight, style])
-                            print(f"  Line {line_num}: Added row - cartons={cartons}, style={style}, pieces={individual_pieces}, weight={individual_weight}")
+                            logger.debug("  Line %s: Added row - cartons=%s, style=%s, pieces=%s, weight=%s", line_num, cartons, style, individual_pieces, individual_weight)
                         else:
-                            print(f"  Line {line_num}: Skipped (no weight found) - {line_stripped}")
+                            logger.debug("  Line %s: Skipped (no weight found) - %s", line_num, line_stripped)
                     except (IndexError, ValueError) as e:
-                        print(f"  Line {line_num}: Skipped (parsing error) - {line_stripped} - {str(e)}")
+                        logger.debug("  Line %s: Skipped (parsing error) - %s - %s", line_num, line_stripped, e)
                 else:
-                    print(f"  Line {line_num}: Skipped (insufficient tokens) - {line_stripped}")
+                    logger.debug("  Line %s: Skipped (insufficient tokens) - %s", line_num, line_stripped)
             else:
-                print(f"  Line {line_num}: Skipped (not a table row) - {line_stripped}")
+                logger.debug("  Line %s: Skipped (not a table row) - %s", line_num, line_stripped)
 
-        print(f"  Extracted {len(rows)} rows total")
+        logger.debug("  Extracted %s rows total", len(rows))
         return rows, has_totals, totals
 
-    def _is_valid_table_row(self, line):
+    @staticmethod
+    def _is_valid_table_row(line):
         """Check if a line is a valid table row using more flexible criteria."""
         # Remove extra spaces
         line = ' '.join(line.split())
@@ -284,7 +334,8 @@ class DataProcessor:
         
         return False
 
-    def _extract_bol_cube(self, content):
+    @staticmethod
+    def _extract_bol_cube(content):
         """Extract BOL Cube from content."""
         lines = content.splitlines()
         for i, line in enumerate(lines):
@@ -301,62 +352,67 @@ class DataProcessor:
 
     def _process_invoice_data(self, invoice_no, data):
         """Process collected data for an invoice and create CSV."""
-        print(f"\n=== Processing Invoice {invoice_no} ===")
+        all_rows, totals = self._collect_invoice_rows(invoice_no, data)
+
+        # Generate CSV
+        formatted_data = self._format_csv(all_rows, totals['pieces'], totals['weight'])
+        if formatted_data:
+            new_filename = f"{invoice_no}.csv"
+            new_file_path = os.path.join(self.session_dir, new_filename)
+            
+            with open(new_file_path, 'w', encoding='utf-8', newline='') as file:
+                file.write(formatted_data)
+            
+            logger.debug("Successfully processed invoice %s with %s rows", invoice_no, len(all_rows))
+            return len(all_rows)  # Return the number of rows processed for the summary
+        else:
+            logger.error("ERROR: Failed to generate CSV for invoice %s", invoice_no)
+            return 0  # Return 0 for failed processing
+
+    def _collect_invoice_rows(self, invoice_no, data):
+        """Gather an invoice's rows across pages and resolve its totals and BOL Cube."""
+        logger.debug("=== Processing Invoice %s ===", invoice_no)
         
         # Count total rows across all pages
         total_rows = sum(len(page['rows']) for page in data['pages'])
-        print(f"Total rows found across all pages: {total_rows}")
+        logger.debug("Total rows found across all pages: %s", total_rows)
         
         # Get totals from the last page that has non-empty totals
         totals = None
         bol_cube = ""
-        print("Looking for totals in pages (reverse order):")
+        logger.debug("Looking for totals in pages (reverse order):")
         for i, page in enumerate(reversed(data['pages'])):
-            print(f"  Checking page {len(data['pages'])-i}")
-            print(f"    Has totals: {page['has_totals']}")
+            logger.debug("  Checking page %s", len(data['pages'])-i)
+            logger.debug("    Has totals: %s", page['has_totals'])
             if page['has_totals'] and page['totals']['pieces'] and page['totals']['weight']:
                 totals = page['totals']
                 bol_cube = page['bol_cube']
-                print(f"    Found valid totals: {totals}")
-                print(f"    BOL Cube: {bol_cube}")
+                logger.debug("    Found valid totals: %s", totals)
+                logger.debug("    BOL Cube: %s", bol_cube)
                 break
 
         # If no totals found, calculate from individual rows
         if not totals:
-            print("No pre-calculated totals found. Calculating from individual rows...")
+            logger.debug("No pre-calculated totals found. Calculating from individual rows...")
             totals = self._calculate_totals_from_rows(data['pages'])
             # Use BOL cube from first page that has one
             for page in data['pages']:
                 if page['bol_cube']:
                     bol_cube = page['bol_cube']
                     break
-            print(f"Calculated totals: {totals}")
-            print(f"Using BOL Cube: {bol_cube}")
+            logger.debug("Calculated totals: %s", totals)
+            logger.debug("Using BOL Cube: %s", bol_cube)
 
         # Collect all rows from all pages
         all_rows = []
         for page_num, page in enumerate(data['pages'], 1):
-            print(f"Processing page {page_num}: {len(page['rows'])} rows")
+            logger.debug("Processing page %s: %s rows", page_num, len(page['rows']))
             for row in page['rows']:
                 # row is [cartons, individual_pieces, individual_weight, style]
                 all_rows.append([row[0], bol_cube, row[1], row[2], invoice_no, row[3]])
 
-        print(f"Total rows to process: {len(all_rows)}")
-
-        # Generate CSV
-        formatted_data = self._format_csv(all_rows, totals['pieces'], totals['weight'])
-        if formatted_data:
-            new_filename = f"{invoice_no}.csv"
-            new_file_path = os.path.join(self.session_dir, new_filename)
-            
-            with open(new_file_path, 'w', encoding='utf-8', newline='') as file:
-                file.write(formatted_data)
-            
-            print(f"Successfully processed invoice {invoice_no} with {len(all_rows)} rows")
-            return len(all_rows)  # Return the number of rows processed for the summary
-        else:
-            print(f"ERROR: Failed to generate CSV for invoice {invoice_no}")
-            return 0  # Return 0 for failed processing
+        logger.debug("Total rows to process: %s", len(all_rows))
+        return all_rows, totals
 
     def _calculate_totals_from_rows(self, pages):
         """Calculate totals from individual rows when no totals are found."""
@@ -372,7 +428,7 @@ class DataProcessor:
                     total_pieces += pieces
                     total_weight += weight
                 except (ValueError, IndexError) as e:
-                    print(f"    Warning: Could not parse row {row}: {str(e)}")
+                    logger.warning("    Warning: Could not parse row %s: %s", row, e)
                     continue
         
         return {
@@ -384,8 +440,13 @@ class DataProcessor:
         """Format rows into CSV with proper column mapping."""
         output = io.StringIO()
         writer = csv.writer(output)
+        writer.writerow(self._csv_header())
+        writer.writerows(self._format_rows(rows, total_pieces, total_weight))
+        return output.getvalue()
 
-        # Write header
+    @staticmethod
+    def _csv_header():
+        """Return the 28-column (A-AB) header of the output CSV."""
         header = [""] * 28
         header[0] = "RTS ID"
         header[1] = "RTS Status"
@@ -415,8 +476,10 @@ class DataProcessor:
         header[25] = "Style"                  # Column Z
         header[26] = "Release"                  # Column AA
         header[27] = "Assigned Trucking Co."                  # Column AB
-        writer.writerow(header)
+        return header
 
+    def _format_rows(self, rows, total_pieces, total_weight):
+        """Map collected rows onto the 28 output columns, totals on each invoice's first row."""
         # Sort rows by Invoice No. to ensure consistent grouping
         sorted_rows = sorted(rows, key=lambda x: x[4])  # Sort by Invoice No. (index 4)
         
@@ -424,7 +487,8 @@ class DataProcessor:
         current_invoice = None
         is_first_row = True
 
-        # Write data rows
+        # Build data rows
+        data_rows = []
         for row_data in sorted_rows:
             data_row = [""] * 28
             invoice_no = row_data[4]  # Get current row's invoice number
@@ -448,11 +512,12 @@ class DataProcessor:
                 data_row[23] = total_weight  # Total Weight
                 is_first_row = False
             
-            writer.writerow(data_row)
+            data_rows.append(data_row)
 
-        return output.getvalue()
+        return data_rows
 
-    def _get_invoice_no(self, content):
+    @staticmethod
+    def _get_invoice_no(content):
         """Extract invoice number from content using regex."""
         lines = content.splitlines()
         invoice_no = ""
@@ -499,7 +564,7 @@ class DataProcessor:
                 break
         
         if table_start is None:
-            print("Table header not found in the document.")
+            logger.warning("Table header not found in the document.")
             return None
 
         # --- Process Table Rows and Extract Summary Totals ---
@@ -585,6 +650,50 @@ class DataProcessor:
         
         return output.getvalue()
 
+# Pool entry points: module-level so only the page text or path is pickled
+# to worker processes, never the DataProcessor and its collected rows
+
+def parse_page_file(file_path):
+    """Parse a single TXT page file into (invoice_no, page_data)."""
+    txt_file = os.path.basename(file_path)
+    logger.debug("Collecting data from %s...", txt_file)
+    
+    try:
+        with open(file_path, 'r', encoding='utf-8') as file:
+            content = file.read()
+    except Exception as e:
+        logger.error("Error collecting data from %s: %s", txt_file, e)
+        return None, None
+    
+    return parse_page_content(content, txt_file)
+
+def parse_page_content(content, label):
+    """Parse one page's text into (invoice_no, page_data)."""
+    try:
+        invoice_no = DataProcessor._get_invoice_no(content)
+        if not invoice_no:
+            logger.warning("Invoice number not found in %s", label)
+            return None, None
+
+        # Extract table rows and check for totals
+        table_data = DataProcessor._extract_table_data(content)
+        if not table_data:
+            return invoice_no, None
+        
+        rows, has_totals, totals = table_data
+        page_data = {
+            'rows': rows,  # Don't store full content, just extracted data
+            'has_totals': has_totals,
+            'totals': totals,
+            'bol_cube': DataProcessor._extract_bol_cube(content)
+        }
+        return invoice_no, page_data
+        
+    except Exception as e:
+        logger.error("Error collecting data from %s: %s", label, e)
+        return None, None
+
 if __name__ == "__main__":
+    logging.basicConfig(level=LOG_LEVEL, format="%(message)s")
     processor = DataProcessor()
     processor.process_all_files()
\ No newline at end of file
@@ -1,9 +1,15 @@
 import os
 import gc
+import tempfile
+import threading
+import logging
 import pdfplumber
 import pdf2image
-from utils import PopplerUtils, FileUtils, PopplerNotFoundError
-from config import POPPLER_PATH
+from utils import PopplerUtils, FileUtils, PopplerNotFoundError, ProcessPoolUtils
+from config import POPPLER_PATH, PDF_THREAD_COUNT, PAGE_WORKERS, LOG_LEVEL
+from csv_exporter import CSVExporter
+
+logger = logging.getLogger(__name__)
 
 class PDFProcessor:
     def __init__(self, session_dir):
@@ -16,62 +22,160 @@ class PDFProcessor:
             PopplerUtils.check_poppler_installation()
             self.poppler_available = True
         except PopplerNotFoundError as e:
-            print(f"⚠️ Poppler not available: {str(e)}")
-            print("📄 PDF processing will use pdfplumber only (text extraction)")
+            logger.warning("⚠️ Poppler not available: %s", e)
+            logger.info("📄 PDF processing will use pdfplumber only (text extraction)")
             self.poppler_available = False
         except Exception as e:
-            print(f"⚠️ Error checking Poppler: {str(e)}")
-            print("📄 PDF processing will use pdfplumber only (text extraction)")
+            logger.warning("⚠️ Error checking Poppler: %s", e)
+            logger.info("📄 PDF processing will use pdfplumber only (text extraction)")
             self.poppler_available = False
 
     def process_first_pdf(self):
         """Process the first PDF found in the directory."""
+        return self._process_first_pdf(self.extract_text)
+
+    def extract_first_pdf_pages(self):
+        """Extract the first PDF's page texts into memory instead of TXT files.
+
+        Returns the list of page texts, or None if extraction failed.
+        """
+        pages = []
+        if self._process_first_pdf(lambda pdf_path: self.extract_page_texts(pdf_path, pages)):
+            return pages
+        return None
+
+    def process_all_pdfs(self):
+        """Extract text from every PDF in the directory into TXT files.
+
+        Several PDFs are extracted in parallel worker processes; their TXT
+        files are named <pdf index>_<page>.txt so pages never collide.
+        """
+        results = self._extract_all_pdfs()
+        if results is None:
+            return False
+        if len(results) == 1:
+            pdf_path, pages = results[0]
+            for page_no, text in enumerate(pages or [], 1):
+                self._save_page_text(page_no, text)
+        else:
+            for index, (pdf_path, pages) in enumerate(results, 1):
+                for page_no, text in enumerate(pages or [], 1):
+                    self._save_page_text(f"{index}_{page_no}", text)
+        return all(pages is not None for _, pages in results)
+
+    def extract_all_pdf_pages(self):
+        """Extract every PDF in the directory into one in-memory list of page texts.
+
+        Returns None if there are no PDFs or none could be read.
+        """
+        results = self._extract_all_pdfs()
+        if results is None:
+            return None
+        extracted = [pages for _, pages in results if pages is not None]
+        if not extracted:
+            return None
+        return [text for pages in extracted for text in pages]
+
+    def _extract_all_pdfs(self):
+        """Extract each PDF's page texts (in parallel for several PDFs) and remove the processed PDFs.
+
+        Returns a list of (pdf_path, pages) with pages None on failure, or None if there are no PDFs.
+        """
+        pdf_files = sorted(FileUtils.get_pdf_files(self.session_dir))
+        if not pdf_files:
+            logger.error("❌ No PDF files found in the session directory")
+            return None
+
+        pdf_paths = [os.path.join(self.session_dir, f) for f in pdf_files]
+        if len(pdf_paths) == 1:
+            results = [extract_pdf_pages(pdf_paths[0])]
+        else:
+            workers = min(PAGE_WORKERS, len(pdf_paths))
+            logger.info("📄 Extracting %s PDFs across %s processes", len(pdf_paths), workers)
+            results = ProcessPoolUtils.map(extract_pdf_pages, pdf_paths)
+            if results is None:
+                logger.warning("⚠️ Extracting PDFs sequentially")
+                results = [extract_pdf_pages(pdf_path) for pdf_path in pdf_paths]
+
+        for pdf_path, pages in zip(pdf_paths, results):
+            if pages is None:
+                logger.error("❌ Failed to extract text from PDF: %s", os.path.basename(pdf_path))
+                continue
+            try:
+                os.remove(pdf_path)
+                logger.info("🗑️ Removed processed PDF: %s", os.path.basename(pdf_path))
+            except Exception as cleanup_error:
+                logger.warning("⚠️ Warning: Could not remove PDF file: %s", cleanup_error)
+
+        gc.collect()
+        return list(zip(pdf_paths, results))
+
+    def _process_first_pdf(self, extract):
+        """Run `extract` on the first PDF in the directory, then remove the PDF."""
         try:
             pdf_files = [f for f in os.listdir(self.session_dir) if f.lower().endswith('.pdf')]
             if not pdf_files:
-                print("❌ No PDF files found in the session directory")
+                logger.error("❌ No PDF files found in the session directory")
                 return False
 
             pdf_path = os.path.join(self.session_dir, pdf_files[0])
-            print(f"📄 Processing PDF: {pdf_path}")
+            logger.info("📄 Processing PDF: %s", pdf_path)
         
             # Extract text using pdfplumber (always available)
-            success = self.extract_text(pdf_path)
+            success = extract(pdf_path)
             
             if success:
-                print(f"✅ PDF processed successfully: {pdf_files[0]}")
+                logger.info("✅ PDF processed successfully: %s", pdf_files[0])
             
                 # Clean up the PDF file after processing
                 try:
                     os.remove(pdf_path)
-                    print(f"🗑️ Removed processed PDF: {pdf_files[0]}")
+                    logger.info("🗑️ Removed processed PDF: %s", pdf_files[0])
                 except Exception as cleanup_error:
-                    print(f"⚠️ Warning: Could not remove PDF file: {str(cleanup_error)}")
+                    logger.warning("⚠️ Warning: Could not remove PDF file: %s", cleanup_error)
             
                 # Force garbage collection
                 gc.collect()
             
                 return True
             else:
-                print(f"❌ Failed to extract text from PDF: {pdf_files[0]}")
+                logger.error("❌ Failed to extract text from PDF: %s", pdf_files[0])
                 return False
             
         except Exception as e:
-            print(f"❌ Error processing PDF: {str(e)}")
+            logger.error("❌ Error processing PDF: %s", e)
             return False
 
     def extract_text(self, pdf_path):
         """Extract text from PDF and save as numbered TXT files."""
+        return self._extract_pages(pdf_path, self._save_page_text)
+
+    def extract_page_texts(self, pdf_path, pages):
+        """Extract text from PDF, appending each page's text to `pages`."""
+        return self._extract_pages(pdf_path, lambda page_no, text: pages.append(text))
+
+    def _save_page_text(self, page_no, text):
+        """Save one page's text as <page_no>.txt in the session directory."""
+        text_path = os.path.join(self.session_dir, f"{page_no}.txt")
+        
+        with open(text_path, 'w', encoding='utf-8') as text_file:
+            text_file.write(text)
+        
+        logger.debug("✅ Saved text from page %s to %s", page_no, os.path.basename(text_path))
+
+    @staticmethod
+    def _extract_pages(pdf_path, handle_page):
+        """Extract text from each PDF page and pass it to handle_page(page_no, text)."""
         try:
-            print(f"📄 Extracting text from PDF: {os.path.basename(pdf_path)}")
+            logger.info("📄 Extracting text from PDF: %s", os.path.basename(pdf_path))
             
             with pdfplumber.open(pdf_path) as pdf:
                 if not pdf.pages:
-                    print("❌ PDF has no pages")
+                    logger.error("❌ PDF has no pages")
                     return False
                 
                 page_count = len(pdf.pages)
-                print(f"📄 Processing {page_count} pages")
+                logger.info("📄 Processing %s pages", page_count)
                 
                 for i, page in enumerate(pdf.pages):
                     try:
@@ -79,15 +183,10 @@ class PDFProcessor:
                         text = page.extract_text()
                         
                         if not text or text.strip() == "":
-                            print(f"⚠️ Page {i+1} has no extractable text")
+                            logger.warning("⚠️ Page %s has no extractable text", i+1)
                             text = f"[Page {i+1} - No text content found]"
                         
-                        text_path = os.path.join(self.session_dir, f"{i+1}.txt")
-                    
-                        with open(text_path, 'w', encoding='utf-8') as text_file:
-                            text_file.write(text)
-                        
-                        print(f"✅ Saved text from page {i+1} to {os.path.basename(text_path)}")
+                        handle_page(i + 1, text)
                     
                         # Clear page from memory
                         if hasattr(page, 'flush_cache'):
@@ -98,46 +197,132 @@ class PDFProcessor:
                             gc.collect()
                         
                     except Exception as page_error:
-                        print(f"⚠️ Error processing page {i+1}: {str(page_error)}")
+                        logger.warning("⚠️ Error processing page %s: %s", i+1, page_error)
                         # Continue with other pages
                         continue
                         
-            print(f"✅ Text extraction completed for {page_count} pages")
+            logger.info("✅ Text extraction completed for %s pages", page_count)
             return True
                     
         except pdfplumber.pdfminer.pdfparser.PDFSyntaxError as err:
-            print(f"PDF syntax error → {err}")
+            logger.error("PDF syntax error → %s", err)
             return False
         except Exception as e:
-            print(f"❌ Error extracting text from PDF: {str(e)}")
+            logger.error("❌ Error extracting text from PDF: %s", e)
             return False
 
     def extract_images(self, pdf_path):
         """Convert PDF pages to images and save as numbered JPGs."""
         if not self.poppler_available:
-            print("⚠️ Poppler not available - image extraction skipped")
+            logger.warning("⚠️ Poppler not available - image extraction skipped")
             return False
             
         try:
-            print(f"🖼️ Extracting images from PDF: {os.path.basename(pdf_path)}")
-            
-            images = pdf2image.convert_from_path(
-                pdf_path,
-                poppler_path=POPPLER_PATH
-            )
+            logger.info("🖼️ Extracting images from PDF: %s", os.path.basename(pdf_path))
             
-            for i, image in enumerate(images):
-                image_path = os.path.join(self.session_dir, f"page_{i+1}.jpg")
-                image.save(image_path, "JPEG")
-                print(f"✅ Saved image for page {i+1} to {os.path.basename(image_path)}")
+            # Render pages in parallel straight to disk instead of holding
+            # every page as a PIL image in memory
+            with tempfile.TemporaryDirectory(dir=self.session_dir) as render_dir:
+                image_paths = pdf2image.convert_from_path(
+                    pdf_path,
+                    poppler_path=POPPLER_PATH,
+                    thread_count=PDF_THREAD_COUNT,
+                    output_folder=render_dir,
+                    fmt="jpeg",
+                    paths_only=True
+                )
                 
-            print(f"✅ Image extraction completed for {len(images)} pages")
+                for i, rendered_path in enumerate(sorted(image_paths)):
+                    image_path = os.path.join(self.session_dir, f"page_{i+1}.jpg")
+                    os.replace(rendered_path, image_path)
+                    logger.debug("✅ Saved image for page %s to %s", i+1, os.path.basename(image_path))
+                
+            logger.info("✅ Image extraction completed for %s pages", len(image_paths))
             return True
                 
         except Exception as e:
-            print(f"❌ Error converting PDF to images: {str(e)}")
+            logger.error("❌ Error converting PDF to images: %s", e)
+            return False
+
+def extract_pdf_pages(pdf_path):
+    """Return one PDF's page texts, or None on failure.
+
+    Module-level (and free of Poppler checks) so process pools can run it.
+    """
+    pages = []
+    if PDFProcessor._extract_pages(pdf_path, lambda page_no, text: pages.append(text)):
+        return pages
+    return None
+
+class PipelineRunner:
+    """Run PDF -> invoice rows -> combined CSV for one session in a single pass.
+
+    Page texts and parsed rows stay in memory, so nothing is written to and
+    re-read from per-page TXT or per-invoice CSV files.
+    """
+
+    def __init__(self, data_processor, all_pdfs=False, is_cancelled=None):
+        """Initialize the runner with the session's DataProcessor.
+
+        By default only the first PDF is processed (the upload flow); with
+        all_pdfs every PDF in the session directory is extracted. is_cancelled
+        is an optional callable checked alongside cancel() between stages.
+        """
+        self.data_processor = data_processor
+        self.all_pdfs = all_pdfs
+        self.session_dir = data_processor.session_dir
+        self.failed_stage = None  # 'pdf', 'text', 'csv' or 'cancelled' when run() fails
+        self._cancel_event = threading.Event()
+        self._is_cancelled = is_cancelled
+
+    def cancel(self):
+        """Stop at the next stage boundary; nothing further is written to the session."""
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self):
+        """True once cancel() was called or the is_cancelled check reports so."""
+        if self._cancel_event.is_set():
+            return True
+        return self._is_cancelled is not None and self._is_cancelled()
+
+    def _stop_if_cancelled(self):
+        if self.cancelled:
+            logger.info("🛑 Pipeline cancelled for %s", self.session_dir)
+            self.failed_stage = 'cancelled'
+            return True
+        return False
+
+    def run(self):
+        """Process the first PDF in the session directory (every PDF with all_pdfs) into the combined CSV."""
+        if self._stop_if_cancelled():
+            return False
+        pdf_processor = PDFProcessor(self.session_dir)
+        if self.all_pdfs:
+            pages = pdf_processor.extract_all_pdf_pages()
+        else:
+            pages = pdf_processor.extract_first_pdf_pages()
+        if pages is None:
+            self.failed_stage = 'pdf'
+            return False
+
+        if self._stop_if_cancelled():
+            return False
+        result = self.data_processor.process_pages_in_memory(pages)
+        if result is None:
+            self.failed_stage = 'text'
+            return False
+
+        header, rows = result
+        # Last check before touching the session's CSV
+        if self._stop_if_cancelled():
+            return False
+        if not CSVExporter(self.session_dir).write_rows(header, rows):
+            self.failed_stage = 'csv'
             return False
+        return True
 
 if __name__ == "__main__":
+    logging.basicConfig(level=LOG_LEVEL, format="%(message)s")
     processor = PDFProcessor(".")  # Use current directory for CLI usage
     processor.process_first_pdf() 
\ No newline at end of file
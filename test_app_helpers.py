@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the pure helpers behind the CSV merge, upload and download paths.
+Each helper is checked against the straightforward implementation it replaced.
+"""
+
+import base64
+import csv
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+from csv_exporter import CSVExporter
+
+
+# --- count_csv_rows ----------------------------------------------------------
+
+def baseline_row_count(path):
+    """Row count the workflow endpoint used to report: csv.reader records minus the header."""
+    with open(path, newline='') as f:
+        return sum(1 for _ in csv.reader(f)) - 1
+
+
+@pytest.mark.parametrize("content", [
+    'a,b\n1,2\n3,4\n',
+    'a,b\n1,2\n3,4',                                  # no trailing newline
+    'a,b\r\n1,2\r\n3,4\r\n',                          # CRLF line endings
+    'a,b\n"multi\nline",2\n3,"x\ny\nz"\n',            # newlines inside quoted fields
+    'a,b\n"say ""hi""",2\n"""\n""",3\n',              # doubled quotes, one around a newline
+    'a,b\n',                                          # header only
+])
+def test_count_csv_rows_matches_csv_reader(tmp_path, content):
+    path = tmp_path / "data.csv"
+    path.write_bytes(content.encode())
+    assert app.count_csv_rows(str(path)) == baseline_row_count(path)
+
+
+def test_count_csv_rows_quote_spanning_chunks(tmp_path):
+    # A quoted field with newlines that straddles the 1 MiB read boundary
+    filler = 'x' * 62 + ',1\n'
+    rows = ((1 << 20) - 100) // len(filler)
+    content = 'a,b\n' + filler * rows + '"open\n' + 'y\n' * 200 + 'close",2\nlast,3\n'
+    assert len(content.split('"open')[0]) < (1 << 20) < len(content.split('close"')[0])
+    path = tmp_path / "big.csv"
+    path.write_bytes(content.encode())
+    assert app.count_csv_rows(str(path)) == baseline_row_count(path) == rows + 2
+
+
+# --- parse_cancel_date ---------------------------------------------------------
+
+def baseline_parse_cancel_date(date_str):
+    """The per-value parser parse_cancel_date replaced (MDDYYYY or MMDDYYYY, else NaT)."""
+    date_str = str(date_str).strip()
+    if len(date_str) == 7:
+        month, day, year = date_str[0], date_str[1:3], date_str[3:]
+        try:
+            return pd.to_datetime(f"{month.zfill(2)}/{day}/{year}", format="%m/%d/%Y")
+        except Exception:
+            return pd.NaT
+    elif len(date_str) == 8:
+        month, day, year = date_str[0:2], date_str[2:4], date_str[4:]
+        try:
+            return pd.to_datetime(f"{month}/{day}/{year}", format="%m/%d/%Y")
+        except Exception:
+            return pd.NaT
+    return pd.NaT
+
+
+CANCEL_DATES = pd.Series([
+    '3152025', '03152025', '12312024', ' 2202025 ',    # 7- and 8-digit, padded with spaces
+    '2292024', '2292023', '02292000', '02291900',      # leap days, valid and not
+    '13012025', '00102025', '2302025', '4312025',      # bad months and days
+    '1012025x', 'abcdefgh', '1-1-2025', '03/15/25',    # non-digits
+    '315205', '031520255', '', 'nan', np.nan, None,    # wrong lengths and missing values
+    '01011500', '12319999',                            # years outside datetime64[ns]
+], dtype=object)
+
+
+def assert_matches_baseline_dates(parsed):
+    expected = CANCEL_DATES.apply(baseline_parse_cancel_date)
+    assert list(parsed.isna()) == list(expected.isna())
+    assert list(parsed.dropna()) == list(expected.dropna())
+
+
+def test_parse_cancel_date_matches_per_value_parser(monkeypatch):
+    # The pandas path; the numba kernel is covered separately
+    monkeypatch.setattr(app, "_cancel_date_days", None)
+    assert_matches_baseline_dates(app.parse_cancel_date(CANCEL_DATES))
+
+
+@pytest.mark.skipif(app._cancel_date_days is None, reason="numba not installed")
+def test_cancel_date_kernel_matches_per_value_parser():
+    assert_matches_baseline_dates(app.parse_cancel_date(CANCEL_DATES))
+
+
+@pytest.mark.skipif(app._cancel_date_days is None, reason="numba not installed")
+def test_cancel_date_kernel_every_day_of_a_leap_cycle():
+    days = pd.date_range('2023-12-25', '2028-03-05', freq='D')
+    dates = pd.Series(days.strftime('%m%d%Y'), dtype=object)
+    dates = dates.where(~dates.str.startswith('0'), dates.str[1:])  # MDDYYYY where possible
+    assert list(app.parse_cancel_date(dates)) == list(days)
+
+
+# --- match keys ----------------------------------------------------------------
+
+def baseline_match_key(df, cols):
+    """Composite key the merge used to build row by row."""
+    return df[cols].fillna('').apply(
+        lambda row: "_".join([str(x).strip().replace(",", "").lower() for x in row]),
+        axis=1
+    )
+
+
+def test_normalize_match_column_matches_row_keys():
+    df = pd.DataFrame({
+        'Invoice No.': [' A100 ', 'a100', np.nan, 'B,200', None, 'A100'],
+        'Style': ['ST-1', 'st-1', 'ST-1', np.nan, 'X', ' ST-1'],
+        'Cartons': ['1,000', '1000', np.nan, '5', '', '1,000'],
+        'Individual Pieces': [12, 12.0, np.nan, 3, 4, 12],
+    }, dtype=object)
+    cols = list(df.columns)
+    parts = [app.normalize_match_column(df[col]) for col in cols]
+    keys = parts[0].str.cat(parts[1:], sep="_")
+    assert list(keys) == list(baseline_match_key(df, cols))
+    # Missing values become "" rather than "nan"
+    assert app.normalize_match_column(df['Invoice No.'])[2] == ''
+
+
+def baseline_key_pairs(existing_keys, incoming_keys):
+    """(existing row, incoming row) pairs the iterrows merge applied, last write winning."""
+    applied = {}
+    for inc_pos, key in enumerate(incoming_keys):
+        matches = [pos for pos, existing in enumerate(existing_keys) if existing == key]
+        if matches:
+            applied[matches[0]] = inc_pos
+    return sorted(applied.items())
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_match_key_positions_matches_row_loop(seed):
+    rng = np.random.default_rng(seed)
+    existing = rng.integers(0, 15, size=rng.integers(0, 30)).astype(np.uint64)
+    incoming = rng.integers(0, 20, size=rng.integers(0, 30)).astype(np.uint64)
+    existing_pos, incoming_pos = app.match_key_positions(existing, incoming)
+    pairs = sorted(zip(existing_pos.tolist(), incoming_pos.tolist()))
+    assert pairs == baseline_key_pairs(existing.tolist(), incoming.tolist())
+
+
+def test_hash_match_keys_preserves_key_equality():
+    keys = pd.Series(['a100_st-1_1000_12', '', 'a100_st-1_1000_12', 'a100_st-1_100_012', '_'])
+    hashed = app.hash_match_keys(keys)
+    assert hashed.dtype == np.uint64
+    assert hashed[0] == hashed[2]
+    assert len(set(hashed.tolist())) == keys.nunique()
+    # Hashes don't depend on the index, so both frames hash the same key alike
+    assert (app.hash_match_keys(keys.set_axis(range(10, 15))) == hashed).all()
+
+
+# --- write_csv_file ------------------------------------------------------------
+
+@pytest.mark.parametrize("frame", [
+    pd.DataFrame({'Invoice No.': ['A1', 'A2'], 'Cartons': ['3', np.nan], 'Cube': [1.5, np.nan]}),
+    pd.DataFrame({'Style': ['1,000', 'plain'], 'Note': ['say "hi"', 'x']}),
+    pd.DataFrame({'Ship To Name': ['line\nbreak', 'cr\rhere'], 'n': [1, 2]}),
+    pd.DataFrame({'Category': pd.Categorical(['a,b', 'c'])}),
+    pd.DataFrame({'Header, with comma': ['1'], 'Quote "header"': ['2']}),
+    pd.DataFrame({'Empty': pd.Series([], dtype=object)}),
+])
+def test_write_csv_file_matches_to_csv(tmp_path, frame):
+    path = tmp_path / "out.csv"
+    app.write_csv_file(frame, str(path))
+    assert path.read_bytes() == frame.to_csv(index=False).encode()
+
+
+@pytest.mark.parametrize("values, expected", [
+    (['plain', 'text', None], False),
+    (['1,000'], True),
+    (['say "hi"'], True),
+    (['two\nlines'], True),
+    (['carriage\rreturn'], True),
+    (pd.Categorical(['ok', 'a,b']), True),
+    (pd.Categorical(['ok', 'fine']), False),
+    ([1.5, 2.0], False),
+])
+@pytest.mark.skipif(app.pa_csv is None, reason="pyarrow not installed")
+def test_needs_csv_quoting(values, expected):
+    table = app.pa.Table.from_pandas(pd.DataFrame({'col': values}), preserve_index=False)
+    assert app._needs_csv_quoting(table) is expected
+
+
+# --- base64 uploads --------------------------------------------------------------
+
+def wrap_base64(text, width=76):
+    """MIME-style line-wrapped base64 (CRLF every `width` characters)."""
+    return '\r\n'.join(text[i:i + width] for i in range(0, len(text), width)) + '\r\n'
+
+
+@pytest.mark.parametrize("size", [0, 1, 2, 3, 1000, 4099])
+@pytest.mark.parametrize("wrapped", [False, True])
+def test_write_base64_file_matches_b64decode(tmp_path, monkeypatch, size, wrapped):
+    # Small chunks so payloads span several decode steps with a carried remainder
+    monkeypatch.setattr(app, "B64_CHUNK_CHARS", 37)
+    data = os.urandom(size)
+    payload = base64.b64encode(data).decode()
+    if wrapped:
+        payload = wrap_base64(payload)
+    path = tmp_path / "upload.pdf"
+    assert app.write_base64_file(str(path), payload) == size
+    assert path.read_bytes() == base64.b64decode(payload) == data
+
+
+def test_write_base64_file_removes_partial_file_on_bad_padding(tmp_path):
+    path = tmp_path / "upload.pdf"
+    with pytest.raises(Exception):
+        app.write_base64_file(str(path), base64.b64encode(b'some bytes').decode()[:-3])
+    assert not path.exists()
+
+
+@pytest.mark.parametrize("size", [0, 1, 2, 3, 57, 1000])
+def test_base64_decoded_size_ignores_line_breaks(size):
+    payload = base64.b64encode(os.urandom(size)).decode()
+    assert app.base64_decoded_size(payload) == size
+    assert app.base64_decoded_size(wrap_base64(payload)) == size
+    assert app.base64_decoded_size(wrap_base64(payload, width=4)) == size
+    assert app.base64_decoded_size(payload.rstrip('=')) == size
+
+
+# --- Parquet sidecar ---------------------------------------------------------------
+
+def write_combined(path, frame):
+    """Persist frame the way process_csv_file does: CSV first, then its Parquet copy."""
+    app.write_csv_file(frame, str(path))
+    app.write_parquet_sidecar(frame, str(path))
+
+
+SIDECAR_FRAME = pd.DataFrame({
+    'Invoice No.': ['A1', 'A1', 'B2'],
+    'BOL Cube': ['80.00', np.nan, '12.5'],
+    'Ship To Name': ['NA', 'Burlington', ''],
+})
+
+
+@pytest.mark.skipif(app.pq is None, reason="pyarrow.parquet not installed")
+def test_parquet_sidecar_reads_like_the_csv(tmp_path):
+    path = tmp_path / app.OUTPUT_CSV_NAME
+    write_combined(path, SIDECAR_FRAME)
+    assert os.path.basename(app.parquet_sidecar_path(str(path))) == '.combined_data.parquet'
+    sidecar = app.read_parquet_sidecar(str(path), os.stat(path))
+    pd.testing.assert_frame_equal(sidecar, app.read_csv_as_str(str(path)))
+
+
+@pytest.mark.skipif(app.pq is None, reason="pyarrow.parquet not installed")
+def test_parquet_sidecar_ignored_once_csv_changes(tmp_path):
+    path = tmp_path / app.OUTPUT_CSV_NAME
+    write_combined(path, SIDECAR_FRAME)
+
+    # Same size, new mtime
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert app.read_parquet_sidecar(str(path), os.stat(path)) is None
+
+    # Rewritten by something else (new size); reads must see the new CSV
+    write_combined(path, SIDECAR_FRAME)
+    app.read_cached_csv(str(path))
+    path.write_text('Invoice No.,BOL Cube,Ship To Name\nZ9,1.00,Other\n')
+    assert app.read_parquet_sidecar(str(path), os.stat(path)) is None
+    assert list(app.read_cached_csv(str(path))['Invoice No.']) == ['Z9']
+    app.evict_cached_csvs(str(tmp_path))
+
+
+def test_cache_seeded_after_write_reads_like_the_csv(tmp_path, monkeypatch):
+    path = tmp_path / app.OUTPUT_CSV_NAME
+    # Shaped like the merged frame: categorical keys, reordered rows, "" blanks
+    frame = SIDECAR_FRAME.assign(**{'Invoice No.': SIDECAR_FRAME['Invoice No.'].astype('category'),
+                                    'Pallet': ['1', '', '1']}).iloc[[2, 0, 1]]
+    app.write_csv_file(frame, str(path))
+    app.cache_csv_frame(str(path), frame)
+
+    monkeypatch.setattr(app, 'read_csv_as_str', lambda file_path: pytest.fail('cache missed'))
+    cached = app.read_cached_csv(str(path))
+    monkeypatch.undo()
+    pd.testing.assert_frame_equal(cached, app.read_csv_as_str(str(path)))
+    app.evict_cached_csvs(str(tmp_path))
+
+
+
+# --- CSVExporter.write_rows --------------------------------------------------
+
+def test_write_rows_matches_pandas_round_trip(tmp_path):
+    """write_rows output equals the per-invoice CSV -> read_csv -> to_csv path it replaced."""
+    header = ['Cartons', 'Invoice No.', 'Style', 'Total Pieces']
+    rows = [['1', 'A1', 'NA', '10'], ['2', 'A1', 'N/A', ''], ['3', 'B2', 'null', ''],
+            ['4', 'B2', 'S-1,2', 'None'], ['5', 'B2', 'nan', '#N/A'], ['6', 'C3', 'Nappa', 'n/a ']]
+    baseline = tmp_path / 'baseline.csv'
+    with open(baseline, 'w', newline='') as f:
+        csv.writer(f).writerows([header] + rows)
+    pd.read_csv(baseline, dtype=str).to_csv(baseline, index=False)
+
+    assert CSVExporter(str(tmp_path)).write_rows(header, rows)
+    assert (tmp_path / app.OUTPUT_CSV_NAME).read_bytes() == baseline.read_bytes()
+
+
+# --- background pipeline jobs ------------------------------------------------
+
+class StubProcessor:
+    """DataProcessor stand-in whose text stage can act on the session mid-run."""
+
+    session_id = 'session_cancel_test'
+
+    def __init__(self, session_dir, during_parse=lambda: None):
+        self.session_dir = session_dir
+        self.during_parse = during_parse
+
+    def process_pages_in_memory(self, pages):
+        self.during_parse()
+        return ['A'], [['1']]
+
+
+@pytest.fixture
+def stub_pdf_pages(monkeypatch):
+    from pdf_processor import PDFProcessor
+    monkeypatch.setattr(PDFProcessor, 'extract_first_pdf_pages', lambda self: ['page'])
+
+
+def test_pipeline_runner_cancel_skips_csv_write(tmp_path, stub_pdf_pages):
+    runner = None
+    processor = StubProcessor(str(tmp_path), during_parse=lambda: runner.cancel())
+    runner = app.make_pipeline_runner(processor)
+
+    assert runner.run() is False
+    assert runner.failed_stage == 'cancelled'
+    assert not (tmp_path / 'combined_data.csv').exists()
+
+
+def test_pipeline_job_stops_when_session_gets_new_token(tmp_path, stub_pdf_pages):
+    session_dir = str(tmp_path)
+    app.write_pipeline_job_state(session_dir, {'state': 'processing', 'token': 'old'})
+    # Another worker recreates the session and starts its own job mid-parse
+    processor = StubProcessor(session_dir, during_parse=lambda: app.write_pipeline_job_state(
+        session_dir, {'state': 'processing', 'token': 'new'}))
+    runner = app.make_pipeline_runner(
+        processor, is_cancelled=lambda: app.read_pipeline_job_state(session_dir)[0]['token'] != 'old')
+
+    assert app.run_pipeline_job(runner, session_dir) is False
+    assert not (tmp_path / 'combined_data.csv').exists()
+    assert app.read_pipeline_job_state(session_dir)[0] == {'state': 'processing', 'token': 'new'}
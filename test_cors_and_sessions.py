@@ -123,16 +123,19 @@ def test_cors_and_sessions():
     try:
         response = requests.get(f"{base_url}/debug-sessions")
         print(f"   Status: {response.status_code}")
-        data = response.json()
+        if response.status_code == 404:
+            print("   ⚠️  Skipping (/debug-sessions needs the server started with DEBUG_SESSIONS=1)")
+        else:
+            data = response.json()
         
-        print(f"   Current session: {data.get('current_session_id')}")
-        print(f"   Total sessions: {data.get('total_sessions')}")
+            print(f"   Current session: {data.get('current_session_id')}")
+            print(f"   Total sessions: {data.get('total_sessions')}")
         
-        sessions = data.get('sessions', [])
-        for session in sessions[:3]:  # Show first 3 sessions
-            print(f"     - {session.get('session_id')}: {len(session.get('files', []))} files")
+            sessions = data.get('sessions', [])
+            for session in sessions[:3]:  # Show first 3 sessions
+                print(f"     - {session.get('session_id')}: {len(session.get('files', []))} files")
             
-        print("   ✅ Debug endpoint working")
+            print("   ✅ Debug endpoint working")
         
     except Exception as e:
         print(f"   ❌ FAIL: {e}")
@@ -6,9 +6,11 @@ This script demonstrates the fixes that should capture all 366 rows from a 2-pag
 
 import os
 import shutil
+import logging
 from pdf_processor import PDFProcessor
 from data_processor import DataProcessor
 from csv_exporter import CSVExporter
+from config import LOG_LEVEL
 
 def test_pdf_processing():
     """Test the complete PDF processing workflow."""
@@ -118,6 +120,7 @@ def run_full_test(pdf_path=None):
 
 if __name__ == "__main__":
     import sys
+    logging.basicConfig(level=LOG_LEVEL, format="%(message)s")
     
     if len(sys.argv) > 1:
         # Run full test with provided PDF
@@ -3,22 +3,29 @@ import platform
 import shutil
 import sys
 import time
+import threading
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from subprocess import Popen, PIPE
 import openai
-from config import OPENAI_API_KEY, POPPLER_PATH, TYPING_DELAY, LOADING_ANIMATION_CHARS
+from config import OPENAI_API_KEY, POPPLER_PATH, TYPING_DELAY, LOADING_ANIMATION_CHARS, PAGE_WORKERS, LOG_LEVEL
+
+logger = logging.getLogger(__name__)
 
 # OpenAI setup
 try:
     if OPENAI_API_KEY and OPENAI_API_KEY != "dummy-key-for-development":
         openai.api_key = OPENAI_API_KEY
         client = openai.OpenAI(api_key=openai.api_key)
-        print("✅ OpenAI client initialized")
+        logger.info("✅ OpenAI client initialized")
     else:
         client = None
-        print("⚠️ OpenAI API key not configured - OpenAI features disabled")
+        logger.warning("⚠️ OpenAI API key not configured - OpenAI features disabled")
 except Exception as e:
     client = None
-    print(f"⚠️ OpenAI setup failed: {str(e)} - OpenAI features disabled")
+    logger.warning("⚠️ OpenAI setup failed: %s - OpenAI features disabled", e)
 
 class PopplerNotFoundError(Exception):
     """Exception raised when Poppler is not found or not working properly."""
@@ -39,7 +46,7 @@ class PopplerUtils:
                     process = Popen([poppler_exe], stdout=PIPE, stderr=PIPE)
                     process.communicate()
                     if process.returncode == 99:
-                        print("Poppler installation found successfully!")
+                        logger.info("Poppler installation found successfully!")
                         return True
                     else:
                         raise PopplerNotFoundError(f"Poppler exists but returned unexpected code: {process.returncode}")
@@ -56,7 +63,7 @@ class PopplerUtils:
                     process = Popen([poppler_exe, "-v"], stdout=PIPE, stderr=PIPE)
                     stdout, stderr = process.communicate()
                     if process.returncode == 0:
-                        print("Poppler installation found successfully!")
+                        logger.info("Poppler installation found successfully!")
                         return True
                     else:
                         raise PopplerNotFoundError(f"Poppler exists but returned unexpected code: {process.returncode}")
@@ -120,3 +127,42 @@ class FileUtils:
     def get_script_dir():
         """Get the directory where the current script is located."""
         return os.path.dirname(os.path.abspath(__file__))
+
+def _init_worker_logging(level):
+    """Pool worker setup: the server's queue handler isn't inherited, so log to stderr directly."""
+    logging.basicConfig(level=level, format="%(message)s")
+
+class ProcessPoolUtils:
+    """One long-lived worker-process pool shared by page parsing and PDF extraction.
+
+    Workers are started with forkserver (spawn where that is unavailable),
+    never forked from the threaded server process, so they can't inherit
+    locks held by logging or request threads.
+    """
+    _executor = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_executor(cls):
+        """Return the shared pool, creating it on first use."""
+        with cls._lock:
+            if cls._executor is None:
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                cls._executor = ProcessPoolExecutor(max_workers=PAGE_WORKERS, mp_context=context,
+                                                    initializer=_init_worker_logging, initargs=(LOG_LEVEL,))
+            return cls._executor
+
+    @classmethod
+    def map(cls, fn, *iterables):
+        """Map a module-level fn over iterables in the pool; None if no pool is available."""
+        try:
+            return list(cls.get_executor().map(fn, *iterables))
+        except (OSError, BrokenProcessPool) as e:
+            logger.warning("Process pool unavailable (%s)", e)
+            with cls._lock:
+                # A broken pool can't be reused; the next call starts a fresh one
+                if cls._executor is not None:
+                    cls._executor.shutdown(wait=False, cancel_futures=True)
+                    cls._executor = None
+            return None